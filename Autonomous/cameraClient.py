@@ -0,0 +1,117 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+REQUEST_TIMEOUT = (1.0, 1.0)  # (connect, read) seconds
+RTT_SMOOTHING = 0.2  # weight of a new round-trip measurement
+POLL_INTERVAL = 0.02  # seconds between the polls of a StatePoller, about the camera's frame rate
+POLL_RETRY_DELAY = 0.1  # seconds between polls after a failed one
+
+
+class CameraClient:
+    """Rover-side HTTP client for the camera server over one kept-alive connection.
+
+    Requests run on a single worker thread that owns the session, so the connection is
+    reused for every request and opened before the control loop needs it. Every
+    request's round-trip time is measured.
+    """
+
+    def __init__(self, base_url, warm_path='/action', timeout=REQUEST_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.rtt = None  # smoothed round-trip time, seconds
+        self.last_rtt = None
+        self.requests = 0
+
+        # Connect now rather than on the first control step
+        if warm_path is not None:
+            self.executor.submit(self._warm, warm_path)
+
+    def get_json(self, path):
+        """Return the JSON body of path.
+
+        Raises requests.RequestException (HTTP errors included) or ValueError for a bad body.
+        """
+        return self.executor.submit(self._request, path).result()
+
+    def _warm(self, path):
+        try:
+            self._request(path)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Camera server not reachable yet: {e}")
+
+    def _request(self, path):
+        start = time.perf_counter()
+        response = self.session.get(self.base_url + path, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        rtt = time.perf_counter() - start
+        self.last_rtt = rtt
+        self.rtt = rtt if self.rtt is None else self.rtt + RTT_SMOOTHING * (rtt - self.rtt)
+        self.requests += 1
+        return data
+
+    def rtt_text(self):
+        """Return the last and smoothed round-trip times for logging."""
+        if self.rtt is None:
+            return "RTT: n/a"
+        return f"RTT: {self.last_rtt * 1000:.1f} ms (avg {self.rtt * 1000:.1f} ms)"
+
+
+class StatePoller:
+    """Keep the latest JSON body of one camera endpoint, polled over a CameraClient in a background thread.
+
+    latest() returns (parsed body, local capture time), the shape roverRuntime expects;
+    parse turns the JSON into whatever the control code wants. The capture time follows
+    the camera's frames rather than the responses: it is the receive time less the
+    frame's 'age' when the server reports one, and it stays put while the server keeps
+    answering with the same 'frame_id', so a camera stuck on an old frame ages out like a
+    dead link. Responses without a frame id (servers that capture per request) count as
+    new frames. Failed polls leave the previous state in place to age out.
+    """
+
+    def __init__(self, client, path, parse=None, interval=POLL_INTERVAL):
+        self.client = client
+        self.path = path
+        self.parse = parse
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.state = None
+        self.captured_at = None
+        self.frame_id = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def latest(self):
+        with self.lock:
+            return self.state, self.captured_at
+
+    def _run(self):
+        last_error = None
+        while True:
+            try:
+                data = self.client.get_json(self.path)
+            except (requests.RequestException, ValueError) as e:
+                # Report each kind of failure once rather than at the polling rate
+                if str(e) != last_error:
+                    last_error = str(e)
+                    print(f"Error polling {self.path}: {e}")
+                time.sleep(POLL_RETRY_DELAY)
+                continue
+            last_error = None
+            received_at = time.time()
+            state = data if self.parse is None else self.parse(data)
+            frame_id = data.get('frame_id')
+            with self.lock:
+                self.state = state
+                if frame_id is None or frame_id != self.frame_id or self.captured_at is None:
+                    self.frame_id = frame_id
+                    self.captured_at = received_at - max(data.get('age') or 0.0, 0.0)
+            if self.interval:
+                time.sleep(self.interval)
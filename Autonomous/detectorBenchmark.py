@@ -0,0 +1,212 @@
+import argparse
+import csv
+import glob
+import math
+import os
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import markerDetectors
+
+RESOLUTIONS = [(320, 240), (640, 480), (1280, 720)]
+SYNTHETIC_FRAMES = 50
+
+
+def _midpoint(red, blue):
+    if red is None or blue is None:
+        return None
+    return ((red[0] + blue[0]) / 2, (red[1] + blue[1]) / 2)
+
+
+def run_dominance(frame):
+    red, blue, _, _ = markerDetectors.find_dominant_pixels(frame)
+    return {'red': red, 'blue': blue, 'center': _midpoint(red, blue)}
+
+
+def run_dominance_pyramid(frame):
+    red, blue, _, _ = markerDetectors.find_dominant_pixels_pyramid(frame)
+    return {'red': red, 'blue': blue, 'center': _midpoint(red, blue)}
+
+
+def run_hsv(frame):
+    red, blue, _, _ = markerDetectors.detect_hsv_markers(frame)
+    return {'red': red, 'blue': blue, 'center': _midpoint(red, blue)}
+
+
+def run_hsv_lut(frame):
+    red, blue, _, _ = markerDetectors.detect_lut_markers(frame)
+    return {'red': red, 'blue': blue, 'center': _midpoint(red, blue)}
+
+
+def run_brightness(frame):
+    # The brightest blob is the whole white plate, so it only localizes the rover center
+    return {'center': markerDetectors.detect_brightest_blob(frame)}
+
+
+DETECTORS = {
+    'dominance': run_dominance,
+    'dominance-pyramid': run_dominance_pyramid,
+    'hsv-contour': run_hsv,
+    'hsv-lut': run_hsv_lut,
+    'brightness': run_brightness,
+}
+
+
+def make_synthetic_frame(width, height, rng):
+    """Render a rover (white plate with red and blue end markers) on a noisy floor.
+
+    Returns the BGR frame and the ground-truth red, blue and center points in pixels.
+    """
+    floor = rng.integers(70, 140, size=3)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = floor
+    noise = rng.normal(0, 6, size=(height, width, 3))
+    frame = np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+    # Plate and marker sizes scale with the resolution
+    plate_length = width * 0.2
+    plate_width = width * 0.1
+    marker_size = width * 0.04
+    heading = rng.uniform(0, 2 * math.pi)
+    direction = np.array([math.cos(heading), math.sin(heading)])
+    normal = np.array([-direction[1], direction[0]])
+    margin = plate_length
+    center = np.array([rng.uniform(margin, width - margin), rng.uniform(margin, height - margin)])
+
+    def quad(quad_center, half_length, half_width):
+        corners = [quad_center + sx * half_length * direction + sy * half_width * normal
+                   for sx, sy in ((-1, -1), (1, -1), (1, 1), (-1, 1))]
+        return np.round(corners).astype(np.int32)
+
+    offset = (plate_length / 2 - marker_size) * direction
+    red = center - offset
+    blue = center + offset
+    cv2.fillPoly(frame, [quad(center, plate_length / 2, plate_width / 2)], (255, 255, 255))
+    cv2.fillPoly(frame, [quad(red, marker_size / 2, marker_size / 2)], (0, 0, 255))
+    cv2.fillPoly(frame, [quad(blue, marker_size / 2, marker_size / 2)], (255, 0, 0))
+    return frame, {'red': tuple(red), 'blue': tuple(blue), 'center': tuple(center)}
+
+
+def load_recorded_frames(directory):
+    """Load frames from a directory, with ground truth from an optional ground_truth.csv.
+
+    ground_truth.csv has the columns file, red_x, red_y, blue_x, blue_y in the pixel
+    coordinates of the stored images. Frames without a row are timed but not scored.
+    """
+    truths = {}
+    truth_path = os.path.join(directory, 'ground_truth.csv')
+    if os.path.isfile(truth_path):
+        with open(truth_path, newline='') as file:
+            for row in csv.DictReader(file):
+                red = (float(row['red_x']), float(row['red_y']))
+                blue = (float(row['blue_x']), float(row['blue_y']))
+                truths[row['file']] = {'red': red, 'blue': blue, 'center': _midpoint(red, blue)}
+
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, '*'))):
+        frame = cv2.imread(path)
+        if frame is not None:
+            frames.append((frame, truths.get(os.path.basename(path))))
+    return frames
+
+
+def scale_frames(frames, width, height):
+    """Resize recorded frames to a benchmark resolution and scale their ground truth to match."""
+    scaled = []
+    for frame, truth in frames:
+        scale_x = width / frame.shape[1]
+        scale_y = height / frame.shape[0]
+        resized = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        if truth is not None:
+            truth = {name: (point[0] * scale_x, point[1] * scale_y) for name, point in truth.items()}
+        scaled.append((resized, truth))
+    return scaled
+
+
+def benchmark(detector, frames, repeats):
+    """Time a detector over frames and score it against their ground truth."""
+    # Warm up so one-off buffer allocations are not counted
+    detector(frames[0][0])
+
+    latencies = []
+    errors = []
+    misses = 0
+    scored = 0
+    for _ in range(repeats):
+        for frame, truth in frames:
+            start = time.perf_counter()
+            result = detector(frame)
+            latencies.append(time.perf_counter() - start)
+            if truth is None:
+                continue
+            for name, point in result.items():
+                scored += 1
+                if point is None:
+                    misses += 1
+                else:
+                    errors.append(math.hypot(point[0] - truth[name][0], point[1] - truth[name][1]))
+
+    # Allocations are measured in a separate pass since tracing slows everything down.
+    # tracemalloc sees numpy buffers but not memory allocated inside OpenCV.
+    tracemalloc.start()
+    allocated = 0
+    for frame, _ in frames:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        detector(frame)
+        allocated += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'p50_ms': np.percentile(latencies_ms, 50),
+        'p90_ms': np.percentile(latencies_ms, 90),
+        'p99_ms': np.percentile(latencies_ms, 99),
+        'max_ms': latencies_ms.max(),
+        'alloc_kib': allocated / len(frames) / 1024,
+        'error_px': np.mean(errors) if errors else float('nan'),
+        'error_p90_px': np.percentile(errors, 90) if errors else float('nan'),
+        'miss_rate': misses / scored if scored else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the marker detectors on synthetic and recorded frames.')
+    parser.add_argument('--frames', help='directory of recorded frames (with an optional ground_truth.csv)')
+    parser.add_argument('--detectors', nargs='+', choices=sorted(DETECTORS), default=list(DETECTORS))
+    parser.add_argument('--repeats', type=int, default=3, help='passes over the frame set when timing')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the results to this CSV file')
+    args = parser.parse_args()
+
+    recorded = load_recorded_frames(args.frames) if args.frames else []
+    rng = np.random.default_rng(args.seed)
+    rows = []
+
+    print(f"{'source':<10}{'resolution':<12}{'detector':<19}{'p50 ms':>8}{'p90 ms':>8}{'p99 ms':>8}{'max ms':>8}"
+          f"{'KiB/frame':>11}{'err px':>8}{'p90 err':>9}{'miss':>7}")
+    for width, height in RESOLUTIONS:
+        frame_sets = [('synthetic', [make_synthetic_frame(width, height, rng) for _ in range(SYNTHETIC_FRAMES)])]
+        if recorded:
+            frame_sets.append(('recorded', scale_frames(recorded, width, height)))
+
+        for source, frames in frame_sets:
+            for name in args.detectors:
+                result = benchmark(DETECTORS[name], frames, args.repeats)
+                rows.append({'source': source, 'width': width, 'height': height, 'detector': name, **result})
+                print(f"{source:<10}{f'{width}x{height}':<12}{name:<19}{result['p50_ms']:>8.2f}{result['p90_ms']:>8.2f}"
+                      f"{result['p99_ms']:>8.2f}{result['max_ms']:>8.2f}{result['alloc_kib']:>11.1f}"
+                      f"{result['error_px']:>8.2f}{result['error_p90_px']:>9.2f}{result['miss_rate']:>7.1%}")
+
+    if args.output:
+        with open(args.output, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    main()
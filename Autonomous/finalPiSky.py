@@ -1,32 +1,71 @@
 import cv2
-import numpy as np
-from flask import Flask, jsonify, request, Response
+from flask import Flask, jsonify, request, Response, render_template_string
+from werkzeug.serving import WSGIRequestHandler
 import math
 import time
+import threading
+import argparse
+from collections import namedtuple
+from markerDetectors import DETECTORS, create_detector, scale_detection, scale_point
+from poseTracker import MAX_COAST_TIME, PoseTracker, predict_pose, marker_positions
+from mapCalibration import CALIBRATION_FILE, load_calibration
+from frameSources import DECODE_FLAGS, FRAME_SOURCES, create_frame_source, set_buffer_size
+from motionGate import MotionGate
+from multiRoverTracker import MAIN_COLORS, MARKER_COLORS, MultiRoverTracker, Rover
+from overlayLayers import StaticOverlay
+from rtpJpeg import RtpJpegFrameSource
+from telemetryEvents import EVENT_STREAM_MIMETYPE, KEEPALIVE_INTERVAL, format_event
+from udpTelemetry import TELEMETRY_PORT, TelemetrySender, pack_telemetry
+from videoStream import DEFAULT_START_LEVEL, MJPEG_MIMETYPE, PASSTHROUGH_LEVELS, STREAM_LEVELS, MjpegBroadcaster
 
 app = Flask(__name__)
 
-# Initialize webcam
-cap = cv2.VideoCapture(0)
-if not cap.isOpened():
-    print("Error: Could not open webcam.")
-    exit()
+# Webcam, opened from __main__ unless the frames arrive over RTP from a capture-only Pi
+CAPTURE_FPS = 30
+cap = None
 
-# Smoothing variables for marker detection
+# 'freshest' decodes only the newest grabbed frame; 'queued' reads every frame in driver order;
+# 'mjpeg' is 'freshest' taking the webcam's JPEG bytes and decoding them itself (at --decode-scale)
+DEFAULT_CAPTURE_MODE = 'freshest'
+frame_source = None
+
+# Filtered marker positions for the latest frame, derived from the tracked pose
 smoothed_red = None
 smoothed_blue = None
-SMOOTHING_FACTOR = 0.1
-DOMINANCE_THRESHOLD = 25
+tracker = PoseTracker()
 PIXEL_TOLERANCE = 20
 
+# Pixel -> map inches mapping, applied to the tracked points only
+calibration = load_calibration()
+
+# Active marker detector; the capture loop picks up a swap on its next frame
+DEFAULT_DETECTOR = 'dominance'
+detector = create_detector(DEFAULT_DETECTOR)
+
+# Skip detection on frames that match the last detected one, reusing its result (None to detect every frame)
+motion_gate = MotionGate()
+last_detection = None
+
 # Define the array of targets in pixel coordinates as tuples
 targets = [(1257, 261), (1500, 261), (1499, 342), (1493, 386), (1448, 391), (1405, 397), (1355, 395), (1305, 393), (1275, 383), (1252, 361), (1251, 336)]
 
-# Global variables to store previous angle and length
-prev_angle = None
-prev_length = None
-ANGLE_TOLERANCE = 15  # degrees
-LENGTH_TOLERANCE = 20  # pixels
+ANGLE_TOLERANCE = 10  # degrees; sub-pixel marker centroids keep the heading steady enough for a tighter band
+
+# Extra rovers tracked by marker color pair, served under /rovers/<id>/ (add them with --rover)
+rover_tracker = MultiRoverTracker([])
+
+# Immutable result of one capture-and-detect cycle, published by the capture loop
+# (frame may be decoded at 1/scale of the camera resolution, all positions are in camera pixels,
+# and jpeg holds the camera's original compressed frame when there is one)
+Snapshot = namedtuple('Snapshot', ['frame_id', 'timestamp', 'frame', 'scale', 'jpeg', 'detection', 'pose', 'red',
+                                   'blue', 'action', 'rovers'])
+
+# UDP telemetry to the rovers, started from __main__ (None when not serving)
+telemetry_sender = None
+
+# Latest published snapshot; readers take the reference without locking
+latest_snapshot = None
+snapshot_condition = threading.Condition()
 
 
 def get_absolute_angle(x1, y1, x2, y2):
@@ -50,21 +89,6 @@ def get_signed_angle_difference(angle1, angle2):
     return diff
 
 
-def find_most_dominant_pixel(channel, other_channels, color_name):
-    # Calculate a dominance score: how much the target channel exceeds the sum of others
-    dominance = channel.astype(float) - (other_channels[0].astype(float) + other_channels[1].astype(float))
-
-    # Find the maximum dominance score
-    max_dominance = np.max(dominance)
-
-    # If the maximum dominance is below the threshold, return None
-    if max_dominance < DOMINANCE_THRESHOLD:
-        return None
-
-    # Find the pixel with the highest dominance score
-    y, x = np.unravel_index(np.argmax(dominance), dominance.shape)
-    return (x, y)  # Return coordinates (x, y)
-
 def normalize_angle(angle):
     """Normalize angle to [-180, 180] degrees."""
     return (angle + 180) % 360 - 180
@@ -99,208 +123,649 @@ def calculate_angle_and_length(point1, point2):
 def calculate_center(point1, point2):
     return ((point1[0] + point2[0]) // 2, (point1[1] + point2[1]) // 2)
 
-def is_reading_valid(new_length, new_angle):
-    """Check if the new reading is within tolerance of the previous reading."""
-    global prev_length, prev_angle
-    if prev_length is None or prev_angle is None:
-        return True
-    length_diff = abs(new_length - prev_length)
-    angle_diff = abs(normalize_angle(new_angle - prev_angle))
-    return length_diff <= LENGTH_TOLERANCE and angle_diff <= ANGLE_TOLERANCE
+def to_pixel(point):
+    """Round a sub-pixel (x, y) position to the integer pixel OpenCV draws at."""
+    if point is None:
+        return None
+    return (int(round(point[0])), int(round(point[1])))
 
 def process_frame():
-    """Process the frame and return smoothed marker positions."""
-    global smoothed_red, smoothed_blue
-    ret, frame = cap.read()
-    cv2.flip(frame, 1)
+    """Grab a frame and return it with its capture time, decode scale, original JPEG bytes (or None), the raw detection, the tracked pose, the filtered marker positions and the other rovers' states."""
+    global smoothed_red, smoothed_blue, last_detection
+    captured = frame_source.read()
 
     # If frame is not captured, break the loop
-    if not ret:
+    if captured is None:
         print("Error: Failed to capture frame.")
-        return None, None, None
-
-    # Convert BGR (OpenCV default) to RGB
-    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-    # Split the frame into R, G, B channels
-    red_channel = frame_rgb[:, :, 0]
-    green_channel = frame_rgb[:, :, 1]
-    blue_channel = frame_rgb[:, :, 2]
-
-    # Find the pixel with the most dominant red and blue values
-    red_pixel = find_most_dominant_pixel(red_channel, (green_channel, blue_channel), "red")
-    blue_pixel = find_most_dominant_pixel(blue_channel, (red_channel, green_channel), "blue")
-
-    # Apply smoothing to red position if a valid red pixel is found
-    if red_pixel is not None:
-        if smoothed_red is None:
-            smoothed_red = red_pixel
-        else:
-            smoothed_red = (
-                int(smoothed_red[0] * SMOOTHING_FACTOR + red_pixel[0] * (1 - SMOOTHING_FACTOR)),
-                int(smoothed_red[1] * SMOOTHING_FACTOR + red_pixel[1] * (1 - SMOOTHING_FACTOR))
-            )
+        return None, None, None, None, None, None, None, None, None
+    frame, timestamp, scale, jpeg = captured
+
+    # Detect the markers, hinting the detector with where the tracker last saw them.
+    # A static scene (rover stopped between pulses) reuses the previous detection.
+    moving = motion_gate is None or motion_gate.check(frame, timestamp)
+    blobs = None
+    if rover_tracker.rovers and (moving or last_detection is None):
+        # With other rovers configured, one pass over the frame finds this rover's markers too
+        blobs = rover_tracker.find_blobs(frame, scale)
+        pose = tracker.pose()
+        last_detection = rover_tracker.pair(blobs, MAIN_COLORS, None if pose is None else predict_pose(pose, timestamp))
+    elif moving or last_detection is None:
+        hint = (scale_point(smoothed_red, 1 / scale), scale_point(smoothed_blue, 1 / scale)) \
+            if smoothed_red is not None else None
+        last_detection = scale_detection(detector.detect(frame, hint), scale)
+    detection = last_detection
+
+    # Filter the detections into a pose; the tracker gates outliers and coasts through short dropouts
+    pose = tracker.update(detection, timestamp)
+    if pose is None:
+        smoothed_red, smoothed_blue = None, None
     else:
-        smoothed_red = None  # Reset if no valid red pixel is found
-
-    # Apply smoothing to blue position if a valid blue pixel is found
-    if blue_pixel is not None:
-        if smoothed_blue is None:
-            smoothed_blue = blue_pixel
-        else:
-            smoothed_blue = (
-                int(smoothed_blue[0] * SMOOTHING_FACTOR + blue_pixel[0] * (1 - SMOOTHING_FACTOR)),
-                int(smoothed_blue[1] * SMOOTHING_FACTOR + blue_pixel[1] * (1 - SMOOTHING_FACTOR))
-            )
+        smoothed_red, smoothed_blue = marker_positions(pose)
+
+        # Waypoint progress belongs to tracking, so it happens whether or not anyone is watching
+        if advance_waypoints((pose.x, pose.y), targets):
+            if len(targets) > 0:
+                print(f"Reached waypoint! Moving to next waypoint: {targets[0]}")
+            else:
+                print("All waypoints reached!")
+
+    # The other rovers are paired from the same blobs
+    rovers = rover_tracker.update(blobs, timestamp)
+    for rover_id, state in rovers.items():
+        if state.pose is not None and advance_waypoints((state.pose.x, state.pose.y), rover_tracker.rovers[rover_id].targets):
+            print(f"Rover {rover_id} reached a waypoint")
+
+    return frame, timestamp, scale, jpeg, detection, pose, smoothed_red, smoothed_blue, rovers
+
+def advance_waypoints(center, waypoints):
+    """Drop the first waypoint once center is within PIXEL_TOLERANCE of it; return whether one was dropped."""
+    if len(waypoints) > 0 and math.dist(center, waypoints[0]) <= PIXEL_TOLERANCE:
+        waypoints.pop(0)
+        return True
+    return False
+
+def compute_action(pose, waypoints=None):
+    """Return (action, distance, angle) from a pose towards the current target, or None if nothing is tracked.
+
+    waypoints defaults to the main rover's targets.
+    """
+    # Work on a copy: the capture loop pops reached waypoints while request threads call this
+    waypoints = list(targets if waypoints is None else waypoints)
+    if pose is None:
+        return None
+    if len(waypoints) == 0:
+        return 'stop', None, None
+
+    center = (pose.x, pose.y)
+    target_point = waypoints[0]
+    distance = math.sqrt((center[0] - target_point[0]) ** 2 + (center[1] - target_point[1]) ** 2)
+    angle1 = get_absolute_angle(center[0], center[1], target_point[0], target_point[1])
+    angle2 = get_absolute_angle(100, 100, 200, 100)
+    angle3 = pose.heading
+    anglex = get_signed_angle_difference(angle1, angle2)
+    angley = get_signed_angle_difference(angle3, angle2)
+    # Wrap into [-180, 180) so the turn is the short way round, e.g. +3 rather than -357
+    angle = normalize_angle(-(anglex - angley))
+
+    if angle > ANGLE_TOLERANCE:
+        action = 'right'
+    elif angle < -ANGLE_TOLERANCE:
+        action = 'left'
+    elif distance >= PIXEL_TOLERANCE:
+        action = 'forward'
     else:
-        smoothed_blue = None
+        action = 'error'
+
+    return action, distance, angle
+
+def capture_loop():
+    """Own the camera: grab, detect and publish a snapshot for every frame at the sensor rate."""
+    global latest_snapshot
+    frame_id = 0
+    while True:
+        frame, timestamp, scale, jpeg, detection, pose, smoothed_red, smoothed_blue, rovers = process_frame()
+        if frame is None:
+            time.sleep(0.1)
+            continue
+
+        # Snapshots are shared between request threads, so freeze the frame
+        frame.flags.writeable = False
+        frame_id += 1
+        snapshot = Snapshot(frame_id, timestamp, frame, scale, jpeg, detection, pose, smoothed_red, smoothed_blue,
+                            compute_action(pose), rovers)
+        with snapshot_condition:
+            latest_snapshot = snapshot
+            snapshot_condition.notify_all()
+        if telemetry_sender is not None:
+            telemetry_sender.send(snapshot_packet(snapshot))
+
+def snapshot_packet(snapshot):
+    """Return the binary UDP telemetry packet of a snapshot."""
+    pose = snapshot.pose
+    action, distance, angle = snapshot.action if snapshot.action is not None else (None, None, None)
+    return pack_telemetry(snapshot.frame_id, snapshot.timestamp, snapshot.red, snapshot.blue,
+                          None if pose is None else (pose.x, pose.y), None if pose is None else pose.heading,
+                          distance, angle, action)
+
+def wait_for_snapshot(last_frame_id, timeout=1.0):
+    """Block until a snapshot newer than last_frame_id is published, or return None on timeout."""
+    with snapshot_condition:
+        snapshot_condition.wait_for(
+            lambda: latest_snapshot is not None and latest_snapshot.frame_id != last_frame_id,
+            timeout=timeout)
+        snapshot = latest_snapshot
+    if snapshot is None or snapshot.frame_id == last_frame_id:
+        return None
+    return snapshot
 
-    return frame, smoothed_red, smoothed_blue
+def fresh_snapshot():
+    """Return the latest snapshot, or None if there is none or the camera stopped delivering frames.
 
-def draw_visuals(frame, smoothed_red, smoothed_blue, target_index):
-    """Draw markers, direction vectors, targets, and detailed metrics on the frame."""
+    A snapshot older than MAX_COAST_TIME would have its pose extrapolated well past anything
+    the camera saw, so the endpoints answer it like a failed capture instead.
+    """
+    snapshot = latest_snapshot
+    if snapshot is None or time.time() - snapshot.timestamp > MAX_COAST_TIME:
+        return None
+    return snapshot
+
+def frame_info(snapshot):
+    """Return the frame id, capture time and age of a snapshot, for responses a rover polls.
+
+    The age is measured on this clock, so a rover can tell how old a state is without
+    synchronized clocks, and a repeated frame id tells it the camera has not moved on.
+    """
+    return {'frame_id': snapshot.frame_id, 'timestamp': snapshot.timestamp, 'age': time.time() - snapshot.timestamp}
+
+def current_pose(snapshot):
+    """Return the snapshot's pose extrapolated to the current time, or None if nothing is tracked."""
+    if snapshot.pose is None:
+        return None
+    return predict_pose(snapshot.pose, time.time())
+
+def to_display(point, scale):
+    """Map a camera-pixel position onto a frame decoded at 1/scale, rounded to the pixel OpenCV draws at."""
+    return to_pixel(scale_point(point, 1 / scale))
+
+def put_text(frame, text, y, color, scale=1):
+    """Write a line of overlay text at camera-pixel height y, shrunk to a frame decoded at 1/scale."""
+    cv2.putText(frame, text, to_display((10, y), scale), cv2.FONT_HERSHEY_SIMPLEX, 1 / scale, color,
+                max(round(2 / scale), 1))
+
+def draw_visuals(frame, smoothed_red, smoothed_blue, waypoints, scale=1):
+    """Draw markers, direction vectors, targets, and detailed metrics on the frame.
+
+    Display only: waypoint progress is tracked in process_frame, so waypoints must be a copy
+    that the capture loop cannot pop from. The waypoint dots and text panels come pre-rendered
+    from static_overlay. Positions are in camera pixels; on a frame decoded at 1/scale the
+    overlay is drawn shrunk to match, and the metrics stay in camera pixels.
+    """
+    static_overlay.composite(frame, waypoints, scale)
+    thickness = max(round(2 / scale), 1)
+    smoothed_red, smoothed_blue = to_pixel(smoothed_red), to_pixel(smoothed_blue)
     if smoothed_red:
-        cv2.circle(frame, smoothed_red, 20, (0, 0, 255), 2)  # Red circle
+        cv2.circle(frame, to_display(smoothed_red, scale), round(20 / scale), (0, 0, 255), thickness)  # Red circle
     if smoothed_blue:
-        cv2.circle(frame, smoothed_blue, 20, (255, 0, 0), 2)  # Blue circle
+        cv2.circle(frame, to_display(smoothed_blue, scale), round(20 / scale), (255, 0, 0), thickness)  # Blue circle
 
     # Draw orientation line, midpoint, and metrics if both markers are detected
     if smoothed_red is not None and smoothed_blue is not None:
-        cv2.line(frame, smoothed_red, smoothed_blue, (0, 255, 0), 2)
+        cv2.line(frame, to_display(smoothed_red, scale), to_display(smoothed_blue, scale), (0, 255, 0), thickness)
 
         # Calculate the center of the line
         center = calculate_center(smoothed_red, smoothed_blue)
 
-        # Draw a circle at the center of the line
-        cv2.circle(frame, center, 10, (0, 255, 255), -1)  # Yellow circle at the center
+        # Draw a yellow circle at the center of the line
+        cv2.circle(frame, to_display(center, scale), max(round(10 / scale), 1), (0, 255, 255), -1)
 
         # Check if there are points in the list
-        if len(targets) > 0:
-            target_point = targets[0]
+        if len(waypoints) > 0:
+            target_point = waypoints[0]
 
-            # Draw a line from the yellow circle to the target point
-            cv2.line(frame, center, target_point, (255, 0, 255), 2)  # Magenta line
+            # Draw a magenta line from the yellow circle to the target point
+            cv2.line(frame, to_display(center, scale), to_display(target_point, scale), (255, 0, 255), thickness)
 
             # Calculate the distance between the yellow circle and the target point
             distance = math.sqrt((center[0] - target_point[0]) ** 2 + (center[1] - target_point[1]) ** 2)
 
-            # If the yellow circle is within the pixel tolerance of the target point, remove the point
-            if distance <= PIXEL_TOLERANCE:
-                targets.pop(0)  # Remove the first point
-                if len(targets) > 0:
-                    print(f"Reached waypoint! Moving to next waypoint: {targets[0]}")
-                else:
-                    print("All waypoints reached!")
-
             # Calculate the angle between the red-blue line and the yellow-to-target line
             angle1 = get_absolute_angle(center[0], center[1], target_point[0], target_point[1])
             angle2 = get_absolute_angle(100, 100, 200, 100)
             angle3 = get_absolute_angle(smoothed_red[0], smoothed_red[1], smoothed_blue[0], smoothed_blue[1])
             anglex = get_signed_angle_difference(angle1, angle2)
             angley = get_signed_angle_difference(angle3, angle2)
-            angle = -(anglex - angley)
+            angle = normalize_angle(-(anglex - angley))
 
             # Display the distance and angle on the frame
-            text_distance = f"Distance: {distance:.2f} px"
-            text_angle = f"Angle: {angle:.2f} deg"
-            cv2.putText(frame, text_distance, (10, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            cv2.putText(frame, text_angle, (10, 190), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-
-        # Display the points
-        for point in targets:
-            cv2.circle(frame, point, 5, (255, 255, 0), -1)  # Cyan circles for points
+            put_text(frame, f"Distance: {distance:.2f} px", 150, (255, 255, 255), scale)
+            put_text(frame, f"Angle: {angle:.2f} deg", 190, (255, 255, 255), scale)
 
         # Calculate the length and angle of the line between red and blue points
         length, angle = calculate_angle_and_length(smoothed_red, smoothed_blue)
 
         # Display the length and angle on the frame
-        text_length = f"Length: {length:.2f} px"
-        text_angle = f"Line Angle: {angle:.2f} deg"
-        cv2.putText(frame, text_length, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        cv2.putText(frame, text_angle, (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        put_text(frame, f"Length: {length:.2f} px", 30, (255, 255, 255), scale)
+        put_text(frame, f"Line Angle: {angle:.2f} deg", 70, (255, 255, 255), scale)
     else:
         # Display an error message if one or both colors are not detected
-        cv2.putText(frame, "Error: Colors not detected!", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        put_text(frame, "Error: Colors not detected!", 30, (0, 0, 255), scale)
 
     return frame
 
-def generate_frames(target_index):
-    """Generator for MJPEG streaming of annotated frames."""
-    while True:
-        frame, smoothed_red, smoothed_blue = process_frame()
-        if frame is None:
-            continue
+def render_frame(last_frame_id):
+    """Wait for the next snapshot and return (frame_id, annotated frame) for the video stream, or None on timeout."""
+    # Wait for the capture loop instead of reading the camera from every stream
+    snapshot = wait_for_snapshot(last_frame_id)
+    if snapshot is None:
+        return None
 
-        # Draw all visuals on the frame
-        frame = draw_visuals(frame, smoothed_red, smoothed_blue, target_index)
+    # Draw all visuals on a copy of the shared frame, at the scale it was decoded at;
+    # copy the waypoints too, the capture loop pops them
+    return snapshot.frame_id, draw_visuals(snapshot.frame.copy(), snapshot.red, snapshot.blue, list(targets),
+                                           snapshot.scale)
 
-        # Encode the frame as JPEG
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if not ret:
-            continue
+# Waypoint dots and text panels, re-rendered only when the waypoints change
+static_overlay = StaticOverlay()
+
+# Every /display client shares one render per frame, and one JPEG encode per quality level in use
+video_broadcaster = MjpegBroadcaster(render_frame)
+
+def passthrough_frame(last_frame_id):
+    """Wait for the next snapshot and return (frame_id, the camera's JPEG) for the raw stream, or None on timeout."""
+    snapshot = wait_for_snapshot(last_frame_id)
+    if snapshot is None:
+        return None
+    if snapshot.jpeg is not None:
+        return snapshot.frame_id, snapshot.jpeg
+    # The camera delivered decoded frames; they get one plain encode, still without drawing
+    return snapshot.frame_id, snapshot.frame
 
-        # Yield the frame in MJPEG format
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-        # time.sleep(1/10)
+# /display/raw forwards the camera's JPEGs; /viewer draws the overlay in the browser instead
+raw_broadcaster = MjpegBroadcaster(passthrough_frame, PASSTHROUGH_LEVELS)
 
 @app.route('/markers', methods=['GET'])
 def get_markers():
     """Return marker coordinates for the rover without local display."""
-    target_index = request.args.get('target_index', type=int)
-    frame, smoothed_red, smoothed_blue = process_frame()
-    if frame is None:
+    snapshot = fresh_snapshot()
+    if snapshot is None:
         return jsonify({'error': 'Failed to capture frame'}), 500
 
-    # Draw visuals but don't display locally
-    frame = draw_visuals(frame, smoothed_red, smoothed_blue, target_index)
+    # Report where the markers are now rather than where they were when the frame was taken
+    pose = current_pose(snapshot)
+    if pose is None:
+        return jsonify({'red': None, 'blue': None, 'center': None, **frame_info(snapshot)})
+    smoothed_red, smoothed_blue = marker_positions(pose)
+    world_red, world_blue, world_center = calibration.pixels_to_world([smoothed_red, smoothed_blue, (pose.x, pose.y)])
 
     # Return marker coordinates
     return jsonify({
-        'red': {'x': smoothed_red[0], 'y': smoothed_red[1]} if smoothed_red else None,
-        'blue': {'x': smoothed_blue[0], 'y': smoothed_blue[1]} if smoothed_blue else None,
-        'center': {'x': (smoothed_red[0] + smoothed_red[1])/2, 'y': (smoothed_blue[0] + smoothed_blue[1])/2}
+        'red': {'x': smoothed_red[0], 'y': smoothed_red[1]},
+        'blue': {'x': smoothed_blue[0], 'y': smoothed_blue[1]},
+        'center': {'x': pose.x, 'y': pose.y},
+        'heading': pose.heading,
+        'confidence': snapshot.detection.confidence,
+        'world': {
+            'red': {'x': float(world_red[0]), 'y': float(world_red[1])},
+            'blue': {'x': float(world_blue[0]), 'y': float(world_blue[1])},
+            'center': {'x': float(world_center[0]), 'y': float(world_center[1])},
+        },
+        **frame_info(snapshot)
     })
 
+def snapshot_event(snapshot):
+    """Return the compact telemetry event of a snapshot: frame id, capture time, pose and action."""
+    event = {'frame_id': snapshot.frame_id, 'timestamp': round(snapshot.timestamp, 4),
+             'pose': None, 'red': None, 'blue': None, 'action': None, 'distance': None, 'angle': None}
+    pose = snapshot.pose
+    if pose is not None:
+        event['pose'] = {'x': round(pose.x, 2), 'y': round(pose.y, 2), 'vx': round(pose.vx, 2),
+                         'vy': round(pose.vy, 2), 'heading': round(pose.heading, 2)}
+        event['red'] = [round(value, 2) for value in snapshot.red]
+        event['blue'] = [round(value, 2) for value in snapshot.blue]
+    if snapshot.action is not None:
+        action, distance, angle = snapshot.action
+        event['action'] = action
+        event['distance'] = None if distance is None else round(distance, 2)
+        event['angle'] = None if angle is None else round(angle, 2)
+    return event
+
+def generate_events():
+    """Generator of server-sent telemetry events, one per tracked frame.
+
+    The waypoint list is added to the first event and whenever it changes.
+    """
+    last_frame_id = None
+    last_waypoints = None
+    while True:
+        snapshot = wait_for_snapshot(last_frame_id, timeout=KEEPALIVE_INTERVAL)
+        if snapshot is None:
+            # A comment line keeps the connection alive and lets dead clients be noticed
+            yield ': keepalive\n\n'
+            continue
+        last_frame_id = snapshot.frame_id
+        event = snapshot_event(snapshot)
+        waypoints = list(targets)
+        if waypoints != last_waypoints:
+            event['waypoints'] = waypoints
+            last_waypoints = waypoints
+        yield format_event(event, snapshot.frame_id)
+
+@app.route('/events', methods=['GET'])
+def events():
+    """Push a telemetry event for every new tracked frame, so clients subscribe once instead of polling."""
+    return Response(generate_events(), mimetype=EVENT_STREAM_MIMETYPE,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/display', methods=['GET'])
+@app.route('/video_feed', methods=['GET'])
 def display():
-    """Stream the annotated video feed with all details as MJPEG."""
-    target_index = request.args.get('target_index', type=int)
-    return Response(generate_frames(target_index),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    """Stream the annotated video feed with all details as MJPEG.
+
+    Quality, size and frame rate adapt to the client's link; ?level=, ?min_level= and
+    ?max_level= (indexes into videoStream.STREAM_LEVELS) set the start and the bounds.
+    """
+    level = request.args.get('level', DEFAULT_START_LEVEL, type=int)
+    min_level = request.args.get('min_level', 0, type=int)
+    max_level = request.args.get('max_level', len(STREAM_LEVELS) - 1, type=int)
+    return Response(video_broadcaster.stream(level, min_level, max_level, sock=request.environ.get('werkzeug.socket')),
+                    mimetype=MJPEG_MIMETYPE)
+
+@app.route('/display/stats', methods=['GET'])
+def display_stats():
+    """Report the quality level and throughput of every connected video client."""
+    return jsonify({'clients': video_broadcaster.stats(), 'levels': [level._asdict() for level in STREAM_LEVELS],
+                    'raw_clients': raw_broadcaster.stats()})
+
+@app.route('/display/raw', methods=['GET'])
+def display_raw():
+    """Stream the camera's own JPEGs untouched (no decode, drawing or re-encode); /viewer overlays them."""
+    return Response(raw_broadcaster.stream(0, 0, 0, sock=request.environ.get('werkzeug.socket')),
+                    mimetype=MJPEG_MIMETYPE)
+
+@app.route('/viewer', methods=['GET'])
+def viewer():
+    """Page showing /display/raw with the overlay drawn on a canvas from the /events telemetry."""
+    return render_template_string('''
+        <!DOCTYPE html>
+        <html lang="en">
+        <head>
+            <meta charset="UTF-8">
+            <title>Falconia Camera</title>
+            <style>
+                body { margin: 0; background: #000; }
+                #view { position: relative; display: inline-block; }
+                #view img, #view canvas { display: block; max-width: 100vw; max-height: 100vh; }
+                #view canvas { position: absolute; top: 0; left: 0; width: 100%; height: 100%; }
+            </style>
+        </head>
+        <body>
+            <div id="view">
+                <img id="video" src="/display/raw" alt="Camera">
+                <canvas id="overlay"></canvas>
+            </div>
+
+            <script>
+                // Positions arrive in camera pixels, so the canvas takes the stream's own size
+                const video = document.getElementById('video');
+                const canvas = document.getElementById('overlay');
+                const context = canvas.getContext('2d');
+                let waypoints = [];
+                let latest = null;
+
+                function circle(point, radius, color, fill) {
+                    context.beginPath();
+                    context.arc(point[0], point[1], radius, 0, 2 * Math.PI);
+                    if (fill) { context.fillStyle = color; context.fill(); }
+                    else { context.strokeStyle = color; context.lineWidth = 2; context.stroke(); }
+                }
+
+                function line(from, to, color) {
+                    context.beginPath();
+                    context.moveTo(from[0], from[1]);
+                    context.lineTo(to[0], to[1]);
+                    context.strokeStyle = color;
+                    context.lineWidth = 2;
+                    context.stroke();
+                }
+
+                function panel(lines, top) {
+                    context.fillStyle = 'rgba(0, 0, 0, 0.5)';
+                    context.fillRect(0, top, 430, 40 * lines.length + 5);
+                    context.fillStyle = '#fff';
+                    context.font = '28px sans-serif';
+                    lines.forEach((text, index) => context.fillText(text, 10, top + 30 + 40 * index));
+                }
+
+                function draw() {
+                    if (video.naturalWidth && canvas.width !== video.naturalWidth) {
+                        canvas.width = video.naturalWidth;
+                        canvas.height = video.naturalHeight;
+                    }
+                    context.clearRect(0, 0, canvas.width, canvas.height);
+                    waypoints.forEach(point => circle(point, 5, '#0ff', true));
+                    const data = latest;
+                    if (!data || !data.red || !data.blue) {
+                        context.fillStyle = '#f00';
+                        context.font = '28px sans-serif';
+                        context.fillText('Error: Colors not detected!', 10, 30);
+                        return;
+                    }
+                    circle(data.red, 20, '#f00', false);
+                    circle(data.blue, 20, '#00f', false);
+                    line(data.red, data.blue, '#0f0');
+                    const center = [data.pose.x, data.pose.y];
+                    circle(center, 10, '#ff0', true);
+                    const dx = data.blue[0] - data.red[0], dy = data.blue[1] - data.red[1];
+                    panel(['Length: ' + Math.hypot(dx, dy).toFixed(2) + ' px',
+                           'Line Angle: ' + (Math.atan2(dy, dx) * 180 / Math.PI).toFixed(2) + ' deg'], 0);
+                    if (waypoints.length > 0 && data.distance !== null) {
+                        line(center, waypoints[0], '#f0f');
+                        panel(['Distance: ' + data.distance.toFixed(2) + ' px',
+                               'Angle: ' + data.angle.toFixed(2) + ' deg'], 115);
+                    }
+                }
+
+                // One event per tracked frame; redraw on the next animation frame only
+                const events = new EventSource('/events');
+                let pending = false;
+                events.onmessage = function(message) {
+                    latest = JSON.parse(message.data);
+                    if (latest.waypoints) {
+                        waypoints = latest.waypoints;
+                    }
+                    if (!pending) {
+                        pending = true;
+                        requestAnimationFrame(() => { pending = false; draw(); });
+                    }
+                };
+            </script>
+        </body>
+        </html>
+    ''')
 
 @app.route('/action', methods=['GET'])
 def get_action():
     """Return an action based on the angle and distance to the target."""
-    frame, smoothed_red, smoothed_blue = process_frame()
-    if frame is None:
+    snapshot = fresh_snapshot()
+    if snapshot is None:
         return jsonify({'error': 'Failed to capture frame'}), 500
-    if smoothed_red is None or smoothed_blue is None:
+    pose = current_pose(snapshot)
+    if pose is None:
         return jsonify({'error': 'Markers not detected'}), 400
-    if len(targets) == 0:
-        return jsonify({'action': 'stop', 'message': 'No more targets'})
 
-    center = calculate_center(smoothed_red, smoothed_blue)
-    target_point = targets[0]
-    distance = math.sqrt((center[0] - target_point[0]) ** 2 + (center[1] - target_point[1]) ** 2)
-    angle1 = get_absolute_angle(center[0], center[1], target_point[0], target_point[1])
-    angle2 = get_absolute_angle(100, 100, 200, 100)
-    angle3 = get_absolute_angle(smoothed_red[0], smoothed_red[1], smoothed_blue[0], smoothed_blue[1])
-    anglex = get_signed_angle_difference(angle1, angle2)
-    angley = get_signed_angle_difference(angle3, angle2)
-    angle = -(anglex - angley)
+    # Decide from the pose predicted for now, which hides the capture and detection delay
+    action, distance, angle = compute_action(pose)
+    if action == 'stop':
+        return jsonify({'action': 'stop', 'message': 'No more targets', **frame_info(snapshot)})
 
-    if angle > ANGLE_TOLERANCE:
-        action = 'right'
-    elif angle < -ANGLE_TOLERANCE:
-        action = 'left'
-    elif distance >= PIXEL_TOLERANCE:
-        action = 'forward'
-    else:
-        action = 'error'
+    return jsonify({'action': action, 'distance': distance, 'angle': angle, **frame_info(snapshot)})
+
+@app.route('/state', methods=['GET'])
+def get_state():
+    """Return the action with the marker positions, center and heading it was decided from, in one response.
 
-    return jsonify({'action': action, 'distance': distance, 'angle': angle})
+    Everything comes from a single snapshot and pose, so a rover needs one round trip per
+    step and logs the position its action was computed from.
+    """
+    snapshot = fresh_snapshot()
+    if snapshot is None:
+        return jsonify({'error': 'Failed to capture frame'}), 500
+
+    state = {**frame_info(snapshot), 'action': None, 'distance': None, 'angle': None, 'red': None, 'blue': None,
+             'center': None, 'heading': None, 'world': None}
+    pose = current_pose(snapshot)
+    if pose is not None:
+        action, distance, angle = compute_action(pose)
+        smoothed_red, smoothed_blue = marker_positions(pose)
+        world_x, world_y = calibration.pixel_to_world((pose.x, pose.y))
+        state.update({
+            'action': action, 'distance': distance, 'angle': angle,
+            'red': {'x': smoothed_red[0], 'y': smoothed_red[1]},
+            'blue': {'x': smoothed_blue[0], 'y': smoothed_blue[1]},
+            'center': {'x': pose.x, 'y': pose.y},
+            'heading': pose.heading,
+            'world': {'x': world_x, 'y': world_y},
+        })
+    return jsonify(state)
+
+@app.route('/light_position', methods=['GET'])
+def light_position():
+    """Return the tracked rover center in the format the brightness-tracking clients expect."""
+    snapshot = fresh_snapshot()
+    pose = current_pose(snapshot) if snapshot is not None else None
+    if pose is None:
+        return jsonify({'x': None, 'y': None})
+    return jsonify({'x': pose.x, 'y': pose.y})
+
+def parse_rover(spec):
+    """Return the Rover of an ID:FRONT:BACK[:X,Y...] --rover value; raises ValueError if it is malformed.
+
+    The optional X,Y fields are the rover's own waypoints in pixels. Without them it
+    follows a copy of the main rover's route.
+    """
+    fields = spec.split(':')
+    if len(fields) < 3 or not fields[0] or fields[1] not in MARKER_COLORS or fields[2] not in MARKER_COLORS:
+        raise ValueError(f"--rover expects ID:FRONT:BACK[:X,Y...] with colors from {', '.join(MARKER_COLORS)}, "
+                         f"got {spec!r}")
+    route = []
+    for waypoint in fields[3:]:
+        try:
+            x, y = (int(value) for value in waypoint.split(','))
+        except ValueError:
+            raise ValueError(f"--rover waypoints must be X,Y pixel pairs, got {waypoint!r} in {spec!r}") from None
+        route.append((x, y))
+    return Rover(fields[0], fields[1], fields[2], targets=route if route else targets)
+
+@app.route('/rovers', methods=['GET'])
+def list_rovers():
+    """List the extra rovers and their marker colors."""
+    return jsonify({rover.id: {'front': rover.colors[0], 'back': rover.colors[1], 'targets': len(rover.targets)}
+                    for rover in rover_tracker.rovers.values()})
+
+def rover_state(rover_id):
+    """Return (RoverState, latest snapshot, error response) for one of the extra rovers."""
+    snapshot = fresh_snapshot()
+    if rover_id not in rover_tracker.rovers:
+        return None, None, (jsonify({'error': f'Unknown rover: {rover_id}'}), 404)
+    if snapshot is None or rover_id not in snapshot.rovers:
+        return None, None, (jsonify({'error': 'Failed to capture frame'}), 500)
+    return snapshot.rovers[rover_id], snapshot, None
+
+@app.route('/rovers/<rover_id>/markers', methods=['GET'])
+def get_rover_markers(rover_id):
+    """Return the front and back marker coordinates of one rover."""
+    state, snapshot, error = rover_state(rover_id)
+    if error is not None:
+        return error
+    if state.pose is None:
+        return jsonify({'red': None, 'blue': None, 'center': None, **frame_info(snapshot)})
+    pose = predict_pose(state.pose, time.time())
+    front, back = marker_positions(pose)
+    return jsonify({
+        'red': {'x': front[0], 'y': front[1]},
+        'blue': {'x': back[0], 'y': back[1]},
+        'center': {'x': pose.x, 'y': pose.y},
+        'heading': pose.heading,
+        'confidence': state.detection.confidence,
+        **frame_info(snapshot)
+    })
+
+@app.route('/rovers/<rover_id>/action', methods=['GET'])
+def get_rover_action(rover_id):
+    """Return an action for one rover towards its own next target."""
+    state, snapshot, error = rover_state(rover_id)
+    if error is not None:
+        return error
+    if state.pose is None:
+        return jsonify({'error': 'Markers not detected'}), 400
+    pose = predict_pose(state.pose, time.time())
+    action, distance, angle = compute_action(pose, rover_tracker.rovers[rover_id].targets)
+    if action == 'stop':
+        return jsonify({'action': 'stop', 'message': 'No more targets', **frame_info(snapshot)})
+    return jsonify({'action': action, 'distance': distance, 'angle': angle, **frame_info(snapshot)})
+
+@app.route('/detector', methods=['GET', 'POST'])
+def select_detector():
+    """Report the active detector, or switch to the one named by ?name= without restarting."""
+    global detector
+    name = request.args.get('name')
+    if name is not None:
+        if name not in DETECTORS:
+            return jsonify({'error': f'Unknown detector: {name}', 'available': sorted(DETECTORS)}), 400
+        if name != detector.name:
+            detector = create_detector(name)
+            if motion_gate is not None:
+                motion_gate.reset()
+            print(f"Switched detector to {name}")
+    return jsonify({'detector': detector.name, 'available': sorted(DETECTORS)})
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=12345)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Camera server tracking the rover markers.')
+    parser.add_argument('--detector', choices=sorted(DETECTORS), default=DEFAULT_DETECTOR)
+    parser.add_argument('--port', type=int, default=12345)
+    parser.add_argument('--calibration', default=CALIBRATION_FILE, help='map calibration written by mapCalibration.py')
+    parser.add_argument('--capture', choices=sorted(FRAME_SOURCES), default=DEFAULT_CAPTURE_MODE)
+    parser.add_argument('--buffer-size', type=int, help='frames the camera driver may queue (e.g. 1)')
+    parser.add_argument('--rtp-port', type=int, help='take RTP/JPEG frames on this UDP port instead of the webcam '
+                                                     '(the gst-launch pipelines in Commands.txt send to 5000)')
+    parser.add_argument('--decode-scale', type=int, choices=sorted(DECODE_FLAGS), default=1,
+                        help='decode frames at 1/N resolution for detection (--rtp-port or --capture mjpeg)')
+    parser.add_argument('--no-motion-gate', action='store_true', help='run detection on every frame')
+    parser.add_argument('--telemetry-port', type=int, default=TELEMETRY_PORT, help='UDP port rovers subscribe on')
+    parser.add_argument('--multicast', metavar='GROUP', help='also send UDP telemetry to this multicast group')
+    parser.add_argument('--rover', action='append', default=[], metavar='ID:FRONT:BACK[:X,Y...]',
+                        help=f'also track a rover by its marker colors ({", ".join(MARKER_COLORS)}), optionally '
+                             f'with its own waypoints; repeatable. The main rover is then found in the same pass by its '
+                             f'red and blue markers, instead of by --detector')
+    args = parser.parse_args()
+    detector = create_detector(args.detector)
+    calibration = load_calibration(args.calibration)
+    if args.rtp_port:
+        frame_source = RtpJpegFrameSource(args.rtp_port, args.decode_scale)
+    else:
+        cap = cv2.VideoCapture(0)
+        if not cap.isOpened():
+            print("Error: Could not open webcam.")
+            exit()
+        cap.set(cv2.CAP_PROP_FPS, CAPTURE_FPS)
+        if args.buffer_size:
+            set_buffer_size(cap, args.buffer_size)
+        try:
+            frame_source = create_frame_source(cap, args.capture, args.decode_scale)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.no_motion_gate:
+        motion_gate = None
+    try:
+        rover_tracker = MultiRoverTracker([parse_rover(spec) for spec in args.rover])
+    except ValueError as e:
+        parser.error(str(e))
+
+    telemetry_sender = TelemetrySender(args.telemetry_port, args.multicast)
+
+    # A single background loop owns the camera; the endpoints only read its snapshots
+    threading.Thread(target=capture_loop, daemon=True).start()
+    # HTTP/1.1 keeps the rovers' connections open between requests (HTTP/1.0 closes each one)
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+    app.run(host='0.0.0.0', port=args.port)
\ No newline at end of file
@@ -1,22 +1,50 @@
 import time
-import requests
 import csv
 import os
+import threading
 import spidev
 from adafruit_motorkit import MotorKit
 import adafruit_dht
 import board
+from cameraClient import CameraClient, StatePoller
+from mapCalibration import load_calibration
+from roverRuntime import RoverRuntime
+from steeringControl import DifferentialDriveController
+from udpTelemetry import Telemetry, TelemetryReceiver
 
 # Initialize motor kit
 kit = MotorKit()
 
 # Rover-specific constants
 SPEED = 0.75  # Default motor speed (-1.0 to 1.0)
-STEP_TIME = 0.1  # Time per movement step (seconds)
-
-# Camera server URLs (replace with your camera Pi's IP)
-CAMERA_URL = 'http://192.168.0.103:12345'
-FLASK_SERVER_URL = 'http://192.168.0.103:5000/get_markers'
+LOG_INTERVAL = 1.0  # seconds between sensor log rows; the DHT11 cannot be read much faster
+
+# Camera server (replace with your camera Pi's IP)
+CAMERA_HOST = '192.168.0.103'
+CAMERA_URL = f'http://{CAMERA_HOST}:12345'
+
+def telemetry_from_state(state):
+    """Turn a /state response into the Telemetry tuple the UDP channel delivers."""
+    def point(value):
+        return None if value is None else (value['x'], value['y'])
+    return Telemetry(state['frame_id'], state['timestamp'], point(state['red']), point(state['blue']),
+                     point(state['center']), state['heading'], state['distance'], state['angle'], state['action'])
+
+# 'udp' takes the telemetry the camera server pushes every frame; 'http' polls its /state
+# endpoint over a kept-alive connection, for networks that drop UDP. Either way a background
+# thread keeps the latest state for the control tick.
+TELEMETRY_MODE = 'udp'
+if TELEMETRY_MODE == 'udp':
+    telemetry = TelemetryReceiver(CAMERA_HOST)
+else:
+    telemetry = StatePoller(CameraClient(CAMERA_URL, warm_path='/state'), '/state', parse=telemetry_from_state)
+last_action = None
+
+# Proportional steering towards the current target, from the camera's heading error
+steering = DifferentialDriveController()
+
+# Pixel -> map inches mapping for the logged positions
+calibration = load_calibration()
 
 # Sensor setup
 DHT_SENSOR = adafruit_dht.DHT11
@@ -48,28 +76,15 @@ def read_sensor_data():
     gas_level = read_gas_level()
     return temperature, humidity, gas_level
 
-# Function to fetch position data from the Flask server
-def fetch_position_data():
-    try:
-        response = requests.get(FLASK_SERVER_URL)
-        if response.status_code == 200:
-            data = response.json()
-            return data.get('center', {}).get('x'), data.get('center', {}).get('y')
-        else:
-            print(f"Failed to fetch position data: {response.status_code}")
-            return None, None
-    except Exception as e:
-        print(f"Error fetching position data: {e}")
-        return None, None
-
 # Function to write data to CSV
 def write_to_csv(center_x, center_y, temperature, humidity, gas_level):
     file_exists = os.path.isfile('sensor_data.csv')
+    x_inches, y_inches = calibration.pixel_to_world((center_x, center_y))
     with open('sensor_data.csv', mode='a') as file:
         writer = csv.writer(file)
         if not file_exists:
-            writer.writerow(['Center X', 'Center Y', 'Temperature', 'Humidity', 'Gas Level'])
-        writer.writerow([center_x, center_y, temperature, humidity, gas_level])
+            writer.writerow(['Center X', 'Center Y', 'X (in)', 'Y (in)', 'Temperature', 'Humidity', 'Gas Level'])
+        writer.writerow([center_x, center_y, round(x_inches, 2), round(y_inches, 2), temperature, humidity, gas_level])
 
 # Motor control functions
 def backward(speed=SPEED):
@@ -97,34 +112,45 @@ def stop():
     kit.motor1.throttle = 0
     kit.motor2.throttle = 0
 
-def get_action():
-    """Fetch the action from the camera server."""
-    while True:
-        try:
-            response = requests.get(f'{CAMERA_URL}/action', timeout=3)
-            if response.status_code != 200:
-                print(f"HTTP {response.status_code}. Retrying...")
-                time.sleep(0.1)
-                continue
-            data = response.json()
-            return data.get('action'), data.get('distance'), data.get('angle')
-        except (requests.RequestException, KeyError) as e:
-            print(f"Error fetching action: {e}. Retrying...")
-            time.sleep(0.1)
-
-def main():
-    """Main control loop for autonomous navigation and data logging."""
+def set_wheels(left_speed, right_speed):
+    """Drive each wheel at its own speed, positive forward (-1.0 to 1.0)."""
+    kit.motor1.throttle = -right_speed  # Right wheel
+    kit.motor2.throttle = -left_speed   # Left wheel
+
+def halt():
+    """Stop the rover and forget the steering history, so it restarts cleanly."""
+    stop()
+    steering.reset()
+
+def drive(state):
+    """Control tick: steer towards the current target of the latest camera state; return False once all targets are reached."""
+    global last_action
+    action = state.action
+
+    # Log the action, distance, and angle for debugging when it changes
+    if action != last_action:
+        last_action = action
+        print(f"Action: {action}, Distance: {state.distance}, Angle: {state.angle}")
+
+    if action == 'stop':
+        halt()
+        print("All targets reached!")
+        return False
+    if action in ('forward', 'left', 'right') and state.angle is not None:
+        # Turn in proportion to the heading error rather than spinning on 'left'/'right'
+        set_wheels(*steering.update(state.angle, state.distance))
+    else:
+        # No markers in the latest frame, or no decision yet
+        halt()
+    return True
+
+def log_loop():
+    """Log the sensors with the tracked position every LOG_INTERVAL, away from the control tick."""
     while True:
-        # Get the action from the camera server
-        action, distance, angle = get_action()
-
-        # Log the action, distance, and angle for debugging
-        print(f"Action: {action}, Distance: {distance}, Angle: {angle}")
-
-        # Fetch position data from the Flask server
-        center_x, center_y = fetch_position_data()
+        state, _ = telemetry.latest()
+        if state is not None and state.center is not None:
+            center_x, center_y = state.center
 
-        if center_x is not None and center_y is not None:
             # Read sensor data
             temperature, humidity, gas_level = read_sensor_data()
 
@@ -133,24 +159,17 @@ def main():
 
             # Print data to console (for debugging)
             print(f"Position: ({center_x}, {center_y}), Temperature: {temperature}, Humidity: {humidity}, Gas Level: {gas_level}")
+        time.sleep(LOG_INTERVAL)
 
-        # Perform the action
-        if action == 'forward':
-            backward()
-        elif action == 'left':
-            left()
-        elif action == 'right':
-            right()
-        elif action == 'stop':
-            stop()
-            print("All targets reached!")
-            break
-        else:
-            print(f"Unknown action: {action}")
-            stop()
-
-        # Wait for the next step
-        time.sleep(STEP_TIME)
+def main():
+    """Main control loop for autonomous navigation, with data logging alongside."""
+    threading.Thread(target=log_loop, daemon=True).start()
+    runtime = RoverRuntime(telemetry, drive, halt)
+    try:
+        runtime.run()
+    finally:
+        stop()
+        print(runtime.stats_text())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# A decoded BGR frame, the wall-clock time its grab completed, how many times smaller than
+# the camera resolution it was decoded (pixel coordinates scale by this), and the
+# camera's original JPEG bytes when the frame arrived compressed
+CapturedFrame = namedtuple('CapturedFrame', ['frame', 'timestamp', 'scale', 'jpeg'], defaults=(1, None))
+
+# Decode at 1/scale of the sent resolution; libjpeg skips the DCT work for the dropped detail
+DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def decode_jpeg(jpeg, scale=1):
+    """Decode JPEG bytes to a BGR image at 1/scale resolution, or None if they are corrupt."""
+    return cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), DECODE_FLAGS[scale])
+
+
+def check_decode_scale(scale):
+    if scale not in DECODE_FLAGS:
+        raise ValueError(f'Decode scale must be one of {sorted(DECODE_FLAGS)}, not {scale}')
+
+
+class QueuedFrameSource:
+    """Plain cap.read(): every frame in driver order, however long it sat in the queue."""
+
+    name = 'queued'
+    scalable = False
+
+    def __init__(self, cap):
+        self.cap = cap
+
+    def read(self, timeout=None):
+        """Return the next CapturedFrame, or None if the camera failed."""
+        ret, frame = self.cap.read()
+        if not ret:
+            return None
+        return CapturedFrame(frame, time.time())
+
+
+class FreshestFrameSource:
+    """Grab every frame in a background thread and decode only the newest one on demand.
+
+    grab() only dequeues a driver buffer, so frames nobody asked for are dropped cheaply
+    and the driver queue never backs up. A read() waits for the next grab and has that frame
+    retrieved (decoded) in the grabbing thread, since V4L2 captures must not be shared
+    between threads. The grabber starts on the first read().
+    """
+
+    name = 'freshest'
+    scalable = False
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.condition = threading.Condition()
+        self.waiting = 0  # readers blocked in read()
+        self.sequence = 0  # bumped for every delivered (or failed) frame
+        self.latest = None
+        self.dropped = 0  # grabbed frames that were never decoded
+        self.thread = None
+
+    def start(self):
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._grab_loop, daemon=True)
+                self.thread.start()
+
+    def read(self, timeout=1.0):
+        """Return the CapturedFrame grabbed after this call, or None on failure or timeout."""
+        self.start()
+        with self.condition:
+            sequence = self.sequence
+            self.waiting += 1
+            try:
+                self.condition.wait_for(lambda: self.sequence != sequence, timeout=timeout)
+            finally:
+                self.waiting -= 1
+            if self.sequence == sequence:
+                return None
+            return self.latest
+
+    def _grab_loop(self):
+        while True:
+            grabbed = self.cap.grab()
+            timestamp = time.time()
+            if not grabbed:
+                self._deliver(None)
+                time.sleep(0.1)
+                continue
+
+            with self.condition:
+                wanted = self.waiting > 0
+            if not wanted:
+                self.dropped += 1
+                continue
+
+            self._deliver(self._retrieve(timestamp))
+
+    def _retrieve(self, timestamp):
+        ret, frame = self.cap.retrieve()
+        return CapturedFrame(frame, timestamp) if ret else None
+
+    def _deliver(self, captured):
+        with self.condition:
+            self.latest = captured
+            self.sequence += 1
+            self.condition.notify_all()
+
+
+class MjpegFrameSource(FreshestFrameSource):
+    """Like 'freshest', but take the webcam's MJPEG bytes undecoded and decode them at 1/scale.
+
+    With CAP_PROP_CONVERT_RGB off, the V4L2 backend hands over each MJPG buffer as is, so
+    the only decode is ours, and a reduced-scale one only does a fraction of the IDCT work.
+    The original bytes stay on the CapturedFrame for passing through to viewers. Cameras or
+    backends that still deliver BGR frames are used as they are, at full scale.
+    """
+
+    name = 'mjpeg'
+    scalable = True
+
+    def __init__(self, cap, scale=1):
+        check_decode_scale(scale)
+        super().__init__(cap)
+        self.scale = scale
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        if not cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+            print("Warning: camera backend ignored CONVERT_RGB=0; frames will be decoded at full scale")
+        self.warned = False
+
+    def _retrieve(self, timestamp):
+        ret, buffer = self.cap.retrieve()
+        if not ret:
+            return None
+        if buffer.ndim == 3:
+            if not self.warned:
+                self.warned = True
+                print("Warning: camera delivered decoded frames instead of MJPEG")
+            return CapturedFrame(buffer, timestamp)
+
+        jpeg = buffer.tobytes()
+        frame = decode_jpeg(jpeg, self.scale)
+        if frame is None:
+            return None  # Torn or corrupt buffer
+        return CapturedFrame(frame, timestamp, self.scale, jpeg)
+
+
+FRAME_SOURCES = {
+    FreshestFrameSource.name: FreshestFrameSource,
+    MjpegFrameSource.name: MjpegFrameSource,
+    QueuedFrameSource.name: QueuedFrameSource,
+}
+
+
+def create_frame_source(cap, name, scale=1):
+    """Wrap an opened cv2.VideoCapture in a frame source by registry name; raises KeyError for unknown names.
+
+    scale > 1 decodes at reduced resolution and needs a source that decodes itself (ValueError otherwise).
+    """
+    source = FRAME_SOURCES[name]
+    if source.scalable:
+        return source(cap, scale)
+    if scale != 1:
+        raise ValueError(f"The '{name}' frame source cannot decode at reduced scale")
+    return source(cap)
+
+
+def set_buffer_size(cap, size):
+    """Ask the driver to queue at most size frames; returns whether the backend accepted it."""
+    accepted = cap.set(cv2.CAP_PROP_BUFFERSIZE, size)
+    if not accepted:
+        print(f"Warning: camera backend ignored a buffer size of {size}")
+    return accepted
@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+
+import cv2
+import numpy as np
+
+CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'map_calibration.json')
+
+# Map size in inches, and the pixels of its corners in the overhead camera image.
+# Used when no calibration file exists; this matches the old axis-aligned linear scale.
+MAP_WIDTH_INCHES = 142
+MAP_HEIGHT_INCHES = 92
+DEFAULT_PIXEL_CORNERS = [(58, 23), (760, 23), (58, 469), (760, 469)]  # top-left, top-right, bottom-left, bottom-right
+
+
+def map_corners(width=MAP_WIDTH_INCHES, height=MAP_HEIGHT_INCHES):
+    """Return the world corners of the map in inches, in the same order as DEFAULT_PIXEL_CORNERS."""
+    return [(0, 0), (width, 0), (0, height), (width, height)]
+
+
+class MapCalibration:
+    """Pixel <-> world (inches) mapping for the overhead camera.
+
+    A homography maps undistorted pixels onto the map plane. Lens distortion is optional;
+    when a camera matrix and distortion coefficients are given, points are undistorted
+    before the homography (and distorted again on the way back). Only points are
+    transformed, never whole frames.
+    """
+
+    def __init__(self, homography, camera_matrix=None, dist_coeffs=None):
+        self.homography = np.asarray(homography, dtype=np.float64).reshape(3, 3)
+        self.inverse = np.linalg.inv(self.homography)
+        self.camera_matrix = None if camera_matrix is None else np.asarray(camera_matrix, dtype=np.float64).reshape(3, 3)
+        self.dist_coeffs = None if dist_coeffs is None else np.asarray(dist_coeffs, dtype=np.float64).ravel()
+
+    @classmethod
+    def from_points(cls, pixel_points, world_points, camera_matrix=None, dist_coeffs=None):
+        """Fit a calibration to matching pixel and world (inches) points; four or more are needed."""
+        calibration = cls(np.eye(3), camera_matrix, dist_coeffs)
+        pixels = calibration.undistort(pixel_points).astype(np.float32)
+        world = np.asarray(world_points, dtype=np.float32).reshape(-1, 2)
+        if len(pixels) == 4:
+            homography = cv2.getPerspectiveTransform(pixels, world)
+        else:
+            homography, _ = cv2.findHomography(pixels, world, cv2.RANSAC, 1.0)
+            if homography is None:
+                raise ValueError('Could not fit a homography to the calibration points')
+        return cls(homography, camera_matrix, dist_coeffs)
+
+    @property
+    def distorted(self):
+        return self.camera_matrix is not None and self.dist_coeffs is not None
+
+    def undistort(self, points):
+        """Return an (N, 2) array of pixel points with the lens distortion removed."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        if self.distorted and len(points):
+            points = cv2.undistortPoints(points, self.camera_matrix, self.dist_coeffs, P=self.camera_matrix)
+        return points.reshape(-1, 2)
+
+    def distort(self, points):
+        """Return an (N, 2) array of undistorted pixel points with the lens distortion applied."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if not self.distorted or not len(points):
+            return points
+        # Back to normalized camera rays, then reproject through the lens model
+        rays = cv2.convertPointsToHomogeneous(points).reshape(-1, 3) @ np.linalg.inv(self.camera_matrix).T
+        projected, _ = cv2.projectPoints(rays, np.zeros(3), np.zeros(3), self.camera_matrix, self.dist_coeffs)
+        return projected.reshape(-1, 2)
+
+    def pixels_to_world(self, points):
+        """Map an (N, 2) array of pixel points to map coordinates in inches."""
+        points = self.undistort(points)
+        if not len(points):
+            return points
+        return cv2.perspectiveTransform(points.reshape(-1, 1, 2), self.homography).reshape(-1, 2)
+
+    def world_to_pixels(self, points):
+        """Map an (N, 2) array of map coordinates in inches to pixel points."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if not len(points):
+            return points
+        return self.distort(cv2.perspectiveTransform(points.reshape(-1, 1, 2), self.inverse).reshape(-1, 2))
+
+    def pixel_to_world(self, point):
+        """Map one (x, y) pixel to an (x, y) tuple in inches."""
+        x, y = self.pixels_to_world([point])[0]
+        return float(x), float(y)
+
+    def world_to_pixel(self, point):
+        """Map one (x, y) map position in inches to an (x, y) pixel tuple."""
+        x, y = self.world_to_pixels([point])[0]
+        return float(x), float(y)
+
+    def save(self, path=CALIBRATION_FILE):
+        data = {'homography': self.homography.tolist()}
+        if self.distorted:
+            data['camera_matrix'] = self.camera_matrix.tolist()
+            data['dist_coeffs'] = self.dist_coeffs.tolist()
+        with open(path, 'w') as file:
+            json.dump(data, file, indent=2)
+
+    @classmethod
+    def load(cls, path=CALIBRATION_FILE):
+        with open(path) as file:
+            data = json.load(file)
+        return cls(data['homography'], data.get('camera_matrix'), data.get('dist_coeffs'))
+
+
+def load_calibration(path=CALIBRATION_FILE):
+    """Load the saved calibration, or fall back to the default map corners if there is none."""
+    if os.path.isfile(path):
+        return MapCalibration.load(path)
+    print(f"No calibration at {path}; using the default map corners")
+    return MapCalibration.from_points(DEFAULT_PIXEL_CORNERS, map_corners())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a map calibration from the pixels of the map corners.')
+    parser.add_argument('corners', nargs=4, metavar='X,Y',
+                        help='pixels of the top-left, top-right, bottom-left and bottom-right map corners')
+    parser.add_argument('--size', nargs=2, type=float, default=(MAP_WIDTH_INCHES, MAP_HEIGHT_INCHES),
+                        metavar=('WIDTH', 'HEIGHT'), help='map size in inches')
+    parser.add_argument('--lens', help='JSON file with camera_matrix and dist_coeffs from a chessboard calibration')
+    parser.add_argument('--output', default=CALIBRATION_FILE)
+    args = parser.parse_args()
+
+    pixel_corners = [tuple(float(value) for value in corner.split(',')) for corner in args.corners]
+    camera_matrix = dist_coeffs = None
+    if args.lens:
+        with open(args.lens) as file:
+            lens = json.load(file)
+        camera_matrix, dist_coeffs = lens['camera_matrix'], lens['dist_coeffs']
+
+    calibration = MapCalibration.from_points(pixel_corners, map_corners(*args.size), camera_matrix, dist_coeffs)
+    calibration.save(args.output)
+    print(f"Saved calibration to {args.output}")
+    for pixel, world in zip(pixel_corners, calibration.pixels_to_world(pixel_corners)):
+        print(f"{pixel} -> ({world[0]:.2f}, {world[1]:.2f}) in")
+
+
+if __name__ == '__main__':
+    main()
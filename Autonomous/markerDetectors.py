@@ -0,0 +1,496 @@
+import hashlib
+import math
+import os
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# RGB dominance detector
+DOMINANCE_THRESHOLD = 25
+PYRAMID_SCALE = 4  # downsampling factor of the coarse frame (4 or 8)
+PYRAMID_REFINE_RADIUS = 2 * PYRAMID_SCALE  # half-size of the full-resolution refinement patch
+PYRAMID_MIN_WIDTH = 640  # narrower frames (e.g. decoded at reduced scale) are cheaper to scan in full
+
+# Sub-pixel localization: intensity-weighted centroid around each peak
+CENTROID_RADIUS = 8  # initial half-size of the neighborhood averaged around a peak
+CENTROID_MAX_RADIUS = 64  # the neighborhood doubles up to this while the blob overflows it
+CENTROID_ITERATIONS = 6  # re-centering passes, so flat blobs converge on their middle
+CENTROID_MIN_SUPPORT = 9  # pixels of support needed around a peak for full confidence
+
+# Scan used when there is no track: 'full' searches every pixel, 'pyramid' finds candidate
+# peaks on a downsampled frame and refines them at full resolution
+DETECTION_MODE = 'pyramid'
+
+# Tracking mode: search a window around the last known markers instead of the whole frame
+TRACKING_ENABLED = True
+TRACKING_MARGIN = 40  # pixels added around the markers on every side
+TRACKING_VELOCITY_GAIN = 3  # frames of marker motion added to the margin
+TRACKING_CONFIDENCE_RATIO = 0.5  # rescan the full frame if a peak drops below this fraction of the last full-scan peak
+
+# HSV white-plate / colored-rectangle detector, as (lower, upper) OpenCV HSV ranges per class
+HSV_THRESHOLDS = {
+    'white': [((0, 0, 200), (180, 30, 255))],
+    'red': [((0, 100, 100), (10, 255, 255)), ((160, 100, 100), (180, 255, 255))],
+    'blue': [((90, 100, 100), (120, 255, 255))],
+}
+MIN_PLATE_AREA = 1000  # pixels
+
+# The HSV thresholds are baked into a BGR -> class lookup table quantized to LUT_BITS per
+# channel, so segmentation is one table lookup per pixel and needs no HSV conversion
+CLASS_BACKGROUND, CLASS_WHITE, CLASS_RED, CLASS_BLUE = 0, 1, 2, 3
+LUT_CLASSES = {'white': CLASS_WHITE, 'red': CLASS_RED, 'blue': CLASS_BLUE}
+LUT_BITS = 5
+LUT_CHUNK_ROWS = 64
+LUT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lut_cache')
+
+# Brightness detector
+BRIGHTNESS_THRESHOLD = 200
+
+
+# Reusable int16 buffers for the dominance kernel, grown to the largest region seen
+_dominance_buffers = None
+
+
+def _get_dominance_buffers(height, width):
+    """Return three int16 (height, width) views into the shared dominance buffers."""
+    global _dominance_buffers
+    allocated_height, allocated_width = _dominance_buffers[0].shape if _dominance_buffers else (0, 0)
+    if height > allocated_height or width > allocated_width:
+        shape = (max(height, allocated_height), max(width, allocated_width))
+        _dominance_buffers = tuple(np.empty(shape, dtype=np.int16) for _ in range(3))
+    return tuple(buffer[:height, :width] for buffer in _dominance_buffers)
+
+
+def find_dominant_pixels(frame, window=None, threshold=DOMINANCE_THRESHOLD):
+    """Return the sub-pixel (x, y) of the red and blue dominance peaks of a BGR frame and their confidences.
+
+    Both dominance maps are computed together in int16 into buffers that are reused between
+    frames. Since red dominance is (R - B) - G and blue dominance is -(R - B) - G, the
+    shared R - B and G terms are only computed once. If window is given as (x0, y0, x1, y1),
+    only that region is searched; the returned coordinates are always in frame pixels.
+    Peaks scoring below threshold are returned as None.
+    """
+    x0, y0 = 0, 0
+    if window is not None:
+        x0, y0, x1, y1 = window
+        frame = frame[y0:y1, x0:x1]
+    red_dominance, blue_dominance, green = _get_dominance_buffers(frame.shape[0], frame.shape[1])
+
+    # OpenCV frames are BGR, so index the channels directly instead of converting to RGB
+    blue_channel = frame[:, :, 0]
+    green_channel = frame[:, :, 1]
+    red_channel = frame[:, :, 2]
+
+    np.subtract(red_channel, blue_channel, out=blue_dominance, dtype=np.int16)  # R - B
+    np.copyto(green, green_channel, casting='unsafe')
+    np.subtract(blue_dominance, green, out=red_dominance)  # R - G - B
+    np.add(blue_dominance, green, out=blue_dominance)
+    np.negative(blue_dominance, out=blue_dominance)  # B - R - G
+
+    red_pixel, red_confidence = _dominant_location(red_dominance, x0, y0, threshold)
+    blue_pixel, blue_confidence = _dominant_location(blue_dominance, x0, y0, threshold)
+    return red_pixel, blue_pixel, red_confidence, blue_confidence
+
+
+def _dominant_location(dominance, x0, y0, threshold):
+    """Return the offset centroid of the highest dominance peak, or None if it is below the threshold, and its confidence.
+
+    Confidence grows with the peak score and with how many pixels support the peak, so a
+    single noisy pixel scores low.
+    """
+    index = np.argmax(dominance)
+    y, x = np.unravel_index(index, dominance.shape)
+    score = int(dominance[y, x])
+    if score < threshold:
+        return None, 0.0
+    (centroid_x, centroid_y), support = refine_centroid(dominance, (x, y), max(threshold, score / 2))
+    confidence = min(score / 255, 1.0) * min(support / CENTROID_MIN_SUPPORT, 1.0)
+    return (centroid_x + x0, centroid_y + y0), confidence  # Return coordinates (x, y)
+
+
+def refine_centroid(score_map, peak, floor, radius=CENTROID_RADIUS):
+    """Return the weighted centroid (x, y) around a peak of score_map and the number of pixels supporting it.
+
+    Scores above floor are used as weights (image moments). The window is re-centered on
+    the centroid up to CENTROID_ITERATIONS times, and grown while the blob spills over its
+    edges, so a flat blob converges on its middle rather than on the first maximal pixel
+    argmax finds.
+    """
+    height, width = score_map.shape
+    x, y = float(peak[0]), float(peak[1])
+    support = 1
+    for _ in range(CENTROID_ITERATIONS):
+        center_x, center_y = int(round(x)), int(round(y))
+        x0, y0 = max(center_x - radius, 0), max(center_y - radius, 0)
+        x1, y1 = min(center_x + radius + 1, width), min(center_y + radius + 1, height)
+        weights = score_map[y0:y1, x0:x1].astype(np.float32)
+        weights -= floor
+        np.maximum(weights, 0, out=weights)
+        moments = cv2.moments(weights)
+        if moments['m00'] <= 0:
+            break
+        support = cv2.countNonZero(weights)
+        new_x = x0 + moments['m10'] / moments['m00']
+        new_y = y0 + moments['m01'] / moments['m00']
+        clipped = weights[0].any() or weights[-1].any() or weights[:, 0].any() or weights[:, -1].any()
+        converged = abs(new_x - x) < 0.5 and abs(new_y - y) < 0.5 and not clipped
+        x, y = new_x, new_y
+        if converged:
+            break
+        if clipped and radius < CENTROID_MAX_RADIUS:
+            radius = min(radius * 2, CENTROID_MAX_RADIUS)
+    return (x, y), support
+
+
+def find_dominant_pixels_pyramid(frame):
+    """Coarse-to-fine version of find_dominant_pixels over the whole frame.
+
+    Candidate peaks are found on every PYRAMID_SCALE-th pixel of the frame, then each one is
+    refined at full resolution in a small patch around it, where the usual threshold applies.
+    """
+    if frame.shape[1] < PYRAMID_MIN_WIDTH:
+        return find_dominant_pixels(frame)
+
+    # Strided sampling instead of an INTER_AREA resize, which costs about as much as the full scan it saves
+    small = np.ascontiguousarray(frame[::PYRAMID_SCALE, ::PYRAMID_SCALE])
+
+    # A marker only a few samples wide may be caught at its edge, so accept any positive coarse peak as a candidate
+    coarse_red, coarse_blue, _, _ = find_dominant_pixels(small, threshold=1)
+
+    red_pixel, red_confidence = _refine_peak(frame, coarse_red, 0)
+    blue_pixel, blue_confidence = _refine_peak(frame, coarse_blue, 1)
+    return red_pixel, blue_pixel, red_confidence, blue_confidence
+
+
+def _refine_peak(frame, coarse_pixel, color_index):
+    """Search the full-resolution patch around a coarse peak; color_index 0 is red, 1 is blue."""
+    if coarse_pixel is None:
+        return None, 0.0
+    height, width = frame.shape[:2]
+    center_x = int(round(coarse_pixel[0] * PYRAMID_SCALE))
+    center_y = int(round(coarse_pixel[1] * PYRAMID_SCALE))
+    window = (max(center_x - PYRAMID_REFINE_RADIUS, 0), max(center_y - PYRAMID_REFINE_RADIUS, 0),
+              min(center_x + PYRAMID_REFINE_RADIUS + 1, width), min(center_y + PYRAMID_REFINE_RADIUS + 1, height))
+    result = find_dominant_pixels(frame, window)
+    return result[color_index], result[color_index + 2]
+
+
+def build_color_lut(thresholds=HSV_THRESHOLDS, bits=LUT_BITS, classes=LUT_CLASSES):
+    """Classify the center of every quantized BGR cell with the HSV thresholds.
+
+    Returns a flat uint8 table indexed by (b << 2 * bits) | (g << bits) | r of the
+    quantized channels, holding the classes value of each threshold name.
+    """
+    levels = 1 << bits
+    step = 256 // levels
+    values = np.arange(levels) * step + step // 2
+    b, g, r = np.meshgrid(values, values, values, indexing='ij')
+    colors = np.stack([b, g, r], axis=-1).reshape(-1, 1, 3).astype(np.uint8)
+    hsv = cv2.cvtColor(colors, cv2.COLOR_BGR2HSV)
+
+    lut = np.full(len(colors), CLASS_BACKGROUND, dtype=np.uint8)
+    for name, ranges in thresholds.items():
+        for lower, upper in ranges:
+            mask = cv2.inRange(hsv, np.array(lower), np.array(upper)).ravel() > 0
+            lut[mask] = classes[name]
+    return lut
+
+
+def load_color_lut(thresholds=HSV_THRESHOLDS, bits=LUT_BITS, classes=LUT_CLASSES):
+    """Return the lookup table for these thresholds, building it and caching it to disk if needed."""
+    key = hashlib.sha1(repr((sorted(thresholds.items()), bits, sorted(classes.items()))).encode()).hexdigest()[:16]
+    path = os.path.join(LUT_CACHE_DIR, f'color_lut_{key}.npy')
+    if os.path.isfile(path):
+        return np.load(path)
+
+    lut = build_color_lut(thresholds, bits, classes)
+    try:
+        os.makedirs(LUT_CACHE_DIR, exist_ok=True)
+        np.save(path, lut)
+    except OSError as e:
+        print(f"Could not cache color lookup table: {e}")
+    return lut
+
+
+# Lookup table used by classify_pixels when none is given, loaded on first use
+_color_lut = None
+# Reusable index and class buffers for classify_pixels, keyed by frame shape
+_classify_buffers = {}
+
+
+def classify_pixels(frame, lut=None):
+    """Return a uint8 class map (CLASS_*) of a BGR frame using the color lookup table."""
+    global _color_lut
+    if lut is None:
+        if _color_lut is None:
+            _color_lut = load_color_lut()
+        lut = _color_lut
+
+    shape = frame.shape[:2]
+    buffers = _classify_buffers.get(shape)
+    if buffers is None:
+        buffers = (np.empty(shape, np.uint16), np.empty(shape, np.uint16), np.empty(shape, np.uint8))
+        _classify_buffers[shape] = buffers
+    index, part, classes = buffers
+
+    shift = 8 - LUT_BITS
+    np.right_shift(frame[:, :, 0], shift, out=index, dtype=np.uint16)
+    np.left_shift(index, LUT_BITS, out=index)
+    np.right_shift(frame[:, :, 1], shift, out=part, dtype=np.uint16)
+    np.bitwise_or(index, part, out=index)
+    np.left_shift(index, LUT_BITS, out=index)
+    np.right_shift(frame[:, :, 2], shift, out=part, dtype=np.uint16)
+    np.bitwise_or(index, part, out=index)
+
+    # np.take casts the indices to intp, so look up a band of rows at a time to keep that copy small
+    for row in range(0, shape[0], LUT_CHUNK_ROWS):
+        np.take(lut, index[row:row + LUT_CHUNK_ROWS], out=classes[row:row + LUT_CHUNK_ROWS], mode='clip')
+    return classes
+
+
+def hsv_mask(hsv, ranges):
+    """Return the 0/255 mask of HSV pixels inside any of the (lower, upper) ranges."""
+    mask = None
+    for lower, upper in ranges:
+        part = cv2.inRange(hsv, np.array(lower), np.array(upper))
+        mask = part if mask is None else cv2.bitwise_or(mask, part, dst=mask)
+    return mask
+
+
+def find_white_plate(mask_white):
+    """Return the bounding box (x, y, w, h) of the largest four-cornered white region, or None."""
+    contours, _ = cv2.findContours(mask_white, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    white_rect = None
+    max_area = 0
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area < MIN_PLATE_AREA:  # Filter small areas
+            continue
+        epsilon = 0.02 * cv2.arcLength(contour, True)
+        approx = cv2.approxPolyDP(contour, epsilon, True)
+        if len(approx) == 4 and area > max_area:
+            max_area = area
+            white_rect = approx
+
+    if white_rect is None:
+        return None
+    return cv2.boundingRect(white_rect)
+
+
+def detect_hsv_markers(frame, thresholds=HSV_THRESHOLDS):
+    """Return the (red, blue) rectangle centroids inside the largest white rectangle of a BGR frame and their confidences.
+
+    Pixels are segmented by converting to HSV and thresholding with inRange. Either
+    centroid is None if it is not found.
+    """
+    # Detect white rectangle
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    plate = find_white_plate(hsv_mask(hsv, thresholds['white']))
+    if plate is None:
+        return None, None, 0.0, 0.0
+
+    x, y, w, h = plate
+    hsv_roi = hsv[y:y+h, x:x+w]
+    red, red_confidence = _rectangle_center(hsv_mask(hsv_roi, thresholds['red']), x, y)
+    blue, blue_confidence = _rectangle_center(hsv_mask(hsv_roi, thresholds['blue']), x, y)
+    return red, blue, red_confidence, blue_confidence
+
+
+def detect_lut_markers(frame, lut=None):
+    """Same as detect_hsv_markers, with the pixels segmented by the color lookup table (see classify_pixels)."""
+    classes = classify_pixels(frame, lut)
+
+    # Detect white rectangle
+    plate = find_white_plate(cv2.compare(classes, CLASS_WHITE, cv2.CMP_EQ))
+    if plate is None:
+        return None, None, 0.0, 0.0
+
+    x, y, w, h = plate
+    classes_roi = classes[y:y+h, x:x+w]
+    mask_red = cv2.compare(classes_roi, CLASS_RED, cv2.CMP_EQ)
+    mask_blue = cv2.compare(classes_roi, CLASS_BLUE, cv2.CMP_EQ)
+    red, red_confidence = _rectangle_center(mask_red, x, y)
+    blue, blue_confidence = _rectangle_center(mask_blue, x, y)
+    return red, blue, red_confidence, blue_confidence
+
+
+def _rectangle_center(mask, x0, y0):
+    """Return the offset sub-pixel centroid of the largest contour in mask if it is a quadrilateral, and its confidence.
+
+    The confidence is how completely the contour fills its minimum-area rectangle.
+    """
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None, 0.0
+    largest = max(contours, key=cv2.contourArea)
+    epsilon = 0.02 * cv2.arcLength(largest, True)
+    approx = cv2.approxPolyDP(largest, epsilon, True)
+    if len(approx) != 4:
+        return None, 0.0
+    center = _contour_centroid(largest)
+    if center is None:
+        return None, 0.0
+    (_, _), (w, h), _ = cv2.minAreaRect(largest)
+    confidence = min(cv2.contourArea(largest) / (w * h), 1.0) if w * h > 0 else 0.0
+    return (x0 + center[0], y0 + center[1]), confidence
+
+
+def _contour_centroid(contour):
+    """Return the (x, y) centroid of a contour from its image moments, or None if it has no area."""
+    moments = cv2.moments(contour)
+    if moments['m00'] <= 0:
+        return None
+    return (moments['m10'] / moments['m00'], moments['m01'] / moments['m00'])
+
+
+def detect_brightest_blob(frame):
+    """Return the sub-pixel centroid of the largest region brighter than BRIGHTNESS_THRESHOLD, or None."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(gray, BRIGHTNESS_THRESHOLD, 255, cv2.THRESH_BINARY)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    largest_contour = max(contours, key=cv2.contourArea)
+    return _contour_centroid(largest_contour)
+
+
+# Common result of every detector: marker pixels (None if not found), the rover center and
+# red->blue heading in degrees (None if unknown), and a confidence between 0 and 1
+Detection = namedtuple('Detection', ['red', 'blue', 'center', 'heading', 'confidence'])
+
+
+def marker_pair_detection(red, blue, confidence):
+    """Build a Detection from red and blue marker positions, either of which may be None."""
+    if red is None or blue is None:
+        return Detection(red, blue, None, None, 0.0)
+    center = ((red[0] + blue[0]) / 2, (red[1] + blue[1]) / 2)
+    heading = math.degrees(math.atan2(blue[1] - red[1], blue[0] - red[0])) % 360
+    return Detection(red, blue, center, heading, confidence)
+
+
+def scale_point(point, scale):
+    """Multiply an (x, y) position by scale; None stays None."""
+    if point is None:
+        return None
+    return (point[0] * scale, point[1] * scale)
+
+
+def scale_detection(detection, scale):
+    """Map a detection made on a frame decoded at 1/scale back to camera pixel coordinates."""
+    if scale == 1:
+        return detection
+    return detection._replace(red=scale_point(detection.red, scale), blue=scale_point(detection.blue, scale),
+                              center=scale_point(detection.center, scale))
+
+
+class DominanceDetector:
+    """RGB dominance argmax, searching a tracking window around the hinted markers when it can."""
+
+    name = 'dominance'
+
+    def __init__(self, mode=DETECTION_MODE, tracking=TRACKING_ENABLED):
+        self.mode = mode
+        self.tracking = tracking
+        self.last_red = None
+        self.last_blue = None
+        self.marker_speed = 0  # pixels per frame
+        self.reference_confidence = 0.0
+
+    def detect(self, frame, hint=None):
+        """Detect the markers in a BGR frame; hint is the (red, blue) positions expected from tracking."""
+        window = self.tracking_window(frame.shape, hint) if self.tracking else None
+        if window is not None:
+            red, blue, red_confidence, blue_confidence = find_dominant_pixels(frame, window)
+
+            # Fall back to a full-frame scan when a marker goes missing or its confidence drops
+            if red is None or blue is None \
+                    or min(red_confidence, blue_confidence) < TRACKING_CONFIDENCE_RATIO * self.reference_confidence:
+                window = None
+
+        if window is None:
+            if self.mode == 'pyramid':
+                red, blue, red_confidence, blue_confidence = find_dominant_pixels_pyramid(frame)
+            else:
+                red, blue, red_confidence, blue_confidence = find_dominant_pixels(frame)
+            if red is not None and blue is not None:
+                self.reference_confidence = min(red_confidence, blue_confidence)
+
+        # Measure how far the markers moved since the last frame
+        if None not in (red, blue, self.last_red, self.last_blue):
+            self.marker_speed = max(math.hypot(red[0] - self.last_red[0], red[1] - self.last_red[1]),
+                                    math.hypot(blue[0] - self.last_blue[0], blue[1] - self.last_blue[1]))
+        else:
+            self.marker_speed = 0
+        self.last_red, self.last_blue = red, blue
+
+        return marker_pair_detection(red, blue, min(red_confidence, blue_confidence))
+
+    def tracking_window(self, frame_shape, hint):
+        """Return the (x0, y0, x1, y1) search window around the hinted markers, or None to scan everything."""
+        if hint is None or hint[0] is None or hint[1] is None:
+            return None
+        red, blue = hint
+
+        # Grow the window with how far the markers moved on the previous frame
+        margin = TRACKING_MARGIN + TRACKING_VELOCITY_GAIN * self.marker_speed
+        height, width = frame_shape[:2]
+        x0 = max(int(min(red[0], blue[0]) - margin), 0)
+        y0 = max(int(min(red[1], blue[1]) - margin), 0)
+        x1 = min(int(max(red[0], blue[0]) + margin) + 1, width)
+        y1 = min(int(max(red[1], blue[1]) + margin) + 1, height)
+        return x0, y0, x1, y1
+
+
+class HsvDetector:
+    """Red and blue rectangles inside the white plate, segmented in HSV."""
+
+    name = 'hsv'
+
+    def __init__(self, thresholds=HSV_THRESHOLDS):
+        self.thresholds = thresholds
+
+    def detect(self, frame, hint=None):
+        red, blue, red_confidence, blue_confidence = detect_hsv_markers(frame, self.thresholds)
+        return marker_pair_detection(red, blue, min(red_confidence, blue_confidence))
+
+
+class HsvLutDetector:
+    """HsvDetector segmented with the BGR -> class lookup table instead of an HSV conversion.
+
+    Slower than cvtColor + inRange on the x86 dev box; benchmark both on the Pi before using it.
+    """
+
+    name = 'hsv-lut'
+
+    def __init__(self, thresholds=HSV_THRESHOLDS):
+        self.lut = load_color_lut(thresholds)
+
+    def detect(self, frame, hint=None):
+        red, blue, red_confidence, blue_confidence = detect_lut_markers(frame, self.lut)
+        return marker_pair_detection(red, blue, min(red_confidence, blue_confidence))
+
+
+class BrightnessDetector:
+    """Largest bright region; gives the rover center but no markers or heading."""
+
+    name = 'brightness'
+
+    def detect(self, frame, hint=None):
+        center = detect_brightest_blob(frame)
+        return Detection(None, None, center, None, 0.0 if center is None else 1.0)
+
+
+# Detectors selectable by name at startup or through the camera server's /detector endpoint
+DETECTORS = {
+    DominanceDetector.name: DominanceDetector,
+    HsvDetector.name: HsvDetector,
+    HsvLutDetector.name: HsvLutDetector,
+    BrightnessDetector.name: BrightnessDetector,
+}
+
+
+def create_detector(name):
+    """Return a new detector by registry name; raises KeyError for unknown names."""
+    return DETECTORS[name]()
@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+
+MOTION_SCALE = 8  # downsampling factor of the luma image that is compared
+MOTION_PIXEL_DELTA = 12  # luma change (0-255) of a downsampled pixel that counts as motion
+MOTION_MIN_PIXELS = 3  # changed downsampled pixels needed to call the frame moving
+MOTION_REFRESH_INTERVAL = 1.0  # seconds; detection is forced at least this often
+
+
+class MotionGate:
+    """Decide whether a frame differs enough from the last detected one to be worth detecting.
+
+    Frames are compared on a small, slightly blurred, subsampled luma image, so sensor
+    noise does not count as motion. The reference is the frame detection last ran on, so
+    slow drift still adds up to a trigger, and a detection is forced every
+    MOTION_REFRESH_INTERVAL seconds.
+    """
+
+    def __init__(self, scale=MOTION_SCALE, pixel_delta=MOTION_PIXEL_DELTA, min_pixels=MOTION_MIN_PIXELS,
+                 refresh_interval=MOTION_REFRESH_INTERVAL):
+        self.scale = scale
+        self.pixel_delta = pixel_delta
+        self.min_pixels = min_pixels
+        self.refresh_interval = refresh_interval
+        self.skipped = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the reference so the next frame is always detected."""
+        self.reference = None
+        self.reference_time = None
+
+    def check(self, frame, timestamp):
+        """Return True if frame should be detected, making it the new reference; False to reuse the last result."""
+        # Strided sampling is ~10x cheaper than an INTER_AREA resize; the blur stands in for its averaging
+        small = np.ascontiguousarray(frame[::self.scale, ::self.scale])
+        luma = cv2.blur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (3, 3))
+
+        if self.reference is not None and self.reference.shape == luma.shape \
+                and timestamp - self.reference_time < self.refresh_interval:
+            difference = cv2.absdiff(luma, self.reference)
+            _, moved = cv2.threshold(difference, self.pixel_delta, 255, cv2.THRESH_BINARY)
+            if cv2.countNonZero(moved) < self.min_pixels:
+                self.skipped += 1
+                return False
+
+        self.reference = luma
+        self.reference_time = timestamp
+        return True
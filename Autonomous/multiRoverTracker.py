@@ -0,0 +1,149 @@
+import math
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from markerDetectors import HSV_THRESHOLDS, Detection, classify_pixels, load_color_lut, marker_pair_detection, \
+    scale_point
+from poseTracker import PoseTracker, predict_pose
+
+# Marker colors a rover can carry, as (lower, upper) OpenCV HSV ranges
+MARKER_COLORS = {
+    'red': HSV_THRESHOLDS['red'],
+    'blue': HSV_THRESHOLDS['blue'],
+    'green': [((45, 100, 80), (80, 255, 255))],
+    'yellow': [((20, 100, 100), (35, 255, 255))],
+    'magenta': [((140, 100, 100), (158, 255, 255))],
+}
+MAIN_COLORS = ('red', 'blue')  # front and back markers of the rover the main detector tracks
+
+MIN_MARKER_AREA = 30  # pixels; smaller blobs are noise
+FULL_CONFIDENCE_AREA = 120  # pixels; markers at least this big get full confidence
+MAX_MARKER_SEPARATION = 300  # pixels between the two markers of one rover
+MAX_CANDIDATES = 4  # largest blobs of each color considered when pairing
+MAX_CONTOURS = 64  # outlines measured one by one; a more cluttered mask is labeled in bulk instead
+SPECKLE_SIZE = 3  # pixels; opening the masks with a square this big clears speckle before outlining
+
+# One rover's latest raw detection and filtered pose
+RoverState = namedtuple('RoverState', ['detection', 'pose'])
+
+MISSING = Detection(None, None, None, None, 0.0)
+
+
+class Rover:
+    """A rover identified by the colors of its front (red-position) and back (blue-position) markers."""
+
+    def __init__(self, rover_id, front_color, back_color, targets=()):
+        if front_color not in MARKER_COLORS or back_color not in MARKER_COLORS:
+            raise KeyError(f'Unknown marker color for rover {rover_id}: {front_color}/{back_color}')
+        self.id = rover_id
+        self.colors = (front_color, back_color)
+        self.tracker = PoseTracker()
+        self.targets = list(targets)
+        self.detection = MISSING
+
+
+def largest_components(mask, min_area, count=MAX_CANDIDATES):
+    """Return [(centroid, area), ...] for the count largest connected regions of mask of at least min_area pixels.
+
+    Labeling costs the same however cluttered the mask is, and the filtering is done on
+    the stats arrays, so this is the bounded path for noisy masks.
+    """
+    _, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    keep = np.flatnonzero(areas >= min_area)
+    keep = keep[np.argsort(areas[keep])[::-1][:count]]
+    return [((float(centroids[i + 1][0]), float(centroids[i + 1][1])), float(areas[i])) for i in keep]
+
+
+def largest_blobs(mask, min_area, count=MAX_CANDIDATES):
+    """Return [(centroid, area), ...] for the count largest blobs of mask of at least min_area pixels, largest first."""
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if len(contours) > MAX_CONTOURS:
+        return largest_components(mask, min_area, count)
+
+    found = []
+    for contour in contours:
+        moments = cv2.moments(contour)
+        if moments['m00'] >= min_area:
+            centroid = (moments['m10'] / moments['m00'], moments['m01'] / moments['m00'])
+            found.append((centroid, moments['m00']))
+    found.sort(key=lambda blob: blob[1], reverse=True)
+    return found[:count]
+
+
+class MultiRoverTracker:
+    """Find the marker pairs of several rovers in one pass over each frame.
+
+    Every pixel is classified once with a lookup table holding all the rovers' colors, the
+    main rover's red and blue included, and each color's blobs are found once, however many
+    rovers share it. Per rover only the pairing of candidate blobs and its Kalman tracker remain, so a rover
+    costs little more than the colors it adds. Detections keep the Detection field names:
+    red is the front marker and blue the back one.
+    """
+
+    def __init__(self, rovers):
+        self.rovers = {rover.id: rover for rover in rovers}
+        colors = sorted({color for rover in rovers for color in rover.colors} | set(MAIN_COLORS))
+        self.classes = {color: index + 1 for index, color in enumerate(colors)}
+        self.lut = load_color_lut({color: MARKER_COLORS[color] for color in colors}, classes=self.classes) \
+            if rovers else None
+
+    def update(self, blobs, timestamp):
+        """Track every rover from the blobs find_blobs returned and return {rover id: RoverState}.
+
+        With blobs None the previous detections are fed to the trackers again, as for a
+        frame the motion gate found static.
+        """
+        if blobs is not None:
+            for rover in self.rovers.values():
+                pose = rover.tracker.pose()
+                rover.detection = self.pair(blobs, rover.colors, None if pose is None else predict_pose(pose, timestamp))
+
+        return {rover.id: RoverState(rover.detection, rover.tracker.update(rover.detection, timestamp))
+                for rover in self.rovers.values()}
+
+    def find_blobs(self, frame, scale=1):
+        """Return {color: [(centroid, area), ...]} with the largest blobs of every tracked color, in camera pixels.
+
+        scale is how many times smaller than the camera resolution frame was decoded.
+        """
+        classes = classify_pixels(frame, self.lut)
+        min_area = MIN_MARKER_AREA / (scale * scale)
+        # At reduced scale a marker may be no wider than the kernel, so the kernel shrinks with it
+        size = min(int(math.sqrt(min_area)), SPECKLE_SIZE)
+        kernel = np.ones((size, size), np.uint8) if size > 1 else None
+        blobs = {}
+        for color, class_id in self.classes.items():
+            mask = cv2.compare(classes, class_id, cv2.CMP_EQ)
+            if kernel is not None:
+                mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+            blobs[color] = [(scale_point(centroid, scale), area * scale * scale)
+                            for centroid, area in largest_blobs(mask, min_area)]
+        return blobs
+
+    def pair(self, blobs, colors, hint=None):
+        """Return the Detection of the (front, back) colors in blobs, nearest hint (a Pose) if given."""
+        return self._pair(blobs[colors[0]], blobs[colors[1]], hint)
+
+    def _pair(self, fronts, backs, hint):
+        """Pick the front/back blob pair nearest the predicted pose, or the largest pair without one."""
+        best = None
+        best_cost = None
+        for front, front_area in fronts:
+            for back, back_area in backs:
+                separation = math.hypot(back[0] - front[0], back[1] - front[1])
+                if separation > MAX_MARKER_SEPARATION:
+                    continue
+                if hint is not None:
+                    cost = math.hypot((front[0] + back[0]) / 2 - hint.x, (front[1] + back[1]) / 2 - hint.y)
+                else:
+                    cost = -min(front_area, back_area)
+                if best_cost is None or cost < best_cost:
+                    best, best_cost = (front, back, min(front_area, back_area)), cost
+
+        if best is None:
+            return MISSING
+        front, back, area = best
+        return marker_pair_detection(front, back, min(area / FULL_CONFIDENCE_AREA, 1.0))
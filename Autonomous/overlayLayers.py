@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+
+WAYPOINT_COLOR = (255, 255, 0)  # Cyan
+WAYPOINT_RADIUS = 5
+TEXT_PANELS = [(0, 0, 430, 85), (0, 115, 430, 205)]  # (x0, y0, x1, y1) behind the metric text lines
+TEXT_PANEL_COLOR = (0, 0, 0)
+TEXT_PANEL_ALPHA = 0.5
+
+
+class StaticOverlay:
+    """Pre-rendered layer of the overlay parts that rarely change: waypoint dots and text panels.
+
+    The layer is drawn once per frame size, scale and waypoint list and kept as premultiplied
+    color and alpha crops of the regions it covers, so compositing it only touches those regions.
+    Panels and waypoints are laid out in camera pixels and shrunk for frames decoded at 1/scale.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.regions = []
+
+    def composite(self, frame, waypoints, scale=1):
+        """Blend the layer for waypoints onto frame, decoded at 1/scale of the camera resolution, in place."""
+        key = (frame.shape, scale, tuple(waypoints))
+        if key != self.key:
+            self.regions = self._render(frame.shape, waypoints, scale)
+            self.key = key
+
+        for x0, y0, x1, y1, color, alpha in self.regions:
+            roi = frame[y0:y1, x0:x1]
+            roi[:] = cv2.blendLinear(roi, color, 1.0 - alpha, alpha)
+
+    def _render(self, shape, waypoints, scale=1):
+        height, width = shape[:2]
+        color = np.zeros((height, width, 3), dtype=np.uint8)
+        alpha = np.zeros((height, width), dtype=np.float32)
+        boxes = []
+
+        for panel in TEXT_PANELS:
+            x0, y0, x1, y1 = (round(value / scale) for value in panel)
+            cv2.rectangle(color, (x0, y0), (x1, y1), TEXT_PANEL_COLOR, -1)
+            cv2.rectangle(alpha, (x0, y0), (x1, y1), TEXT_PANEL_ALPHA, -1)
+            boxes.append((x0, y0, x1 + 1, y1 + 1))
+
+        if waypoints:
+            radius = max(round(WAYPOINT_RADIUS / scale), 1)
+            points = [(round(x / scale), round(y / scale)) for x, y in waypoints]
+            for point in points:
+                cv2.circle(color, point, radius, WAYPOINT_COLOR, -1)
+                cv2.circle(alpha, point, radius, 1.0, -1)
+            xs = [point[0] for point in points]
+            ys = [point[1] for point in points]
+            boxes.append((min(xs) - radius, min(ys) - radius, max(xs) + radius + 1, max(ys) + radius + 1))
+
+        regions = []
+        for x0, y0, x1, y1 in boxes:
+            x0, y0 = max(x0, 0), max(y0, 0)
+            x1, y1 = min(x1, width), min(y1, height)
+            if x0 >= x1 or y0 >= y1:
+                continue  # Off screen
+            regions.append((x0, y0, x1, y1, np.ascontiguousarray(color[y0:y1, x0:x1]),
+                            np.ascontiguousarray(alpha[y0:y1, x0:x1])))
+        return regions
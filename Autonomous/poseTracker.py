@@ -0,0 +1,161 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+
+# Process noise: how much the rover is expected to accelerate between frames
+POSITION_ACCELERATION_NOISE = 400.0  # (pixels/s^2)^2
+HEADING_ACCELERATION_NOISE = 4000.0  # (degrees/s^2)^2
+
+# Measurement noise of the detected center and red->blue heading
+POSITION_MEASUREMENT_NOISE = 4.0  # pixels^2
+HEADING_MEASUREMENT_NOISE = 9.0  # degrees^2
+
+GATE_THRESHOLDS = {2: 13.82, 3: 16.27}  # chi-square 99.9% bounds by number of measured values
+MAX_CONSECUTIVE_REJECTS = 5  # restart the track if this many detections in a row are gated out
+MAX_COAST_TIME = 0.5  # seconds without an accepted detection before the track is dropped
+LENGTH_SMOOTHING = 0.2  # weight of a new red-blue separation measurement
+
+# Filtered rover pose: center, velocity, red->blue heading and its rate, marker separation
+Pose = namedtuple('Pose', ['x', 'y', 'vx', 'vy', 'heading', 'heading_rate', 'length', 'timestamp'])
+
+# The filter measures the center and heading, or only the center when the heading is unknown
+MEASUREMENT_MATRIX = np.array([
+    [1, 0, 0, 0, 0, 0],
+    [0, 1, 0, 0, 0, 0],
+    [0, 0, 0, 0, 1, 0],
+], dtype=float)
+MEASUREMENT_NOISE = np.diag([POSITION_MEASUREMENT_NOISE, POSITION_MEASUREMENT_NOISE, HEADING_MEASUREMENT_NOISE])
+
+
+def normalize_angle(angle):
+    """Normalize angle to [-180, 180] degrees."""
+    return (angle + 180) % 360 - 180
+
+
+def predict_pose(pose, timestamp):
+    """Extrapolate a pose to timestamp with its velocities, without touching the filter."""
+    dt = timestamp - pose.timestamp
+    return pose._replace(x=pose.x + pose.vx * dt, y=pose.y + pose.vy * dt,
+                         heading=(pose.heading + pose.heading_rate * dt) % 360, timestamp=timestamp)
+
+
+def marker_positions(pose):
+    """Return the sub-pixel (red, blue) positions implied by a pose."""
+    dx = math.cos(math.radians(pose.heading)) * pose.length / 2
+    dy = math.sin(math.radians(pose.heading)) * pose.length / 2
+    return (pose.x - dx, pose.y - dy), (pose.x + dx, pose.y + dy)
+
+
+class PoseTracker:
+    """Constant-velocity Kalman filter over the rover center and heading.
+
+    The state is [x, y, vx, vy, heading, heading_rate] in pixels and degrees. Detections are
+    gated on their Mahalanobis distance, missed detections are coasted through for up to
+    MAX_COAST_TIME seconds, and the last pose can be extrapolated to any later time.
+    Detections without a heading only correct the center, and a track started from one
+    has zero marker separation.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Drop the current track."""
+        self.state = None
+        self.covariance = None
+        self.length = None
+        self.timestamp = None
+        self.last_accepted = None
+        self.rejected = 0
+
+    def update(self, detection, timestamp):
+        """Feed one frame's markerDetectors.Detection and return the filtered Pose, or None if there is no track."""
+        if self.state is not None:
+            self._predict(timestamp)
+
+        if detection.center is not None:
+            if detection.heading is not None:
+                measurement = np.array([detection.center[0], detection.center[1], detection.heading])
+            else:
+                measurement = np.array([detection.center[0], detection.center[1]])
+            length = None
+            if detection.red is not None and detection.blue is not None:
+                length = math.hypot(detection.blue[0] - detection.red[0], detection.blue[1] - detection.red[1])
+
+            if self.state is None:
+                self._start(measurement, length, timestamp)
+            elif self._correct(measurement):
+                if length is not None:
+                    self.length += LENGTH_SMOOTHING * (length - self.length)
+                self.last_accepted = timestamp
+                self.rejected = 0
+            else:
+                # A run of rejected detections means the rover really moved (e.g. it was picked up)
+                self.rejected += 1
+                if self.rejected >= MAX_CONSECUTIVE_REJECTS:
+                    self._start(measurement, length, timestamp)
+
+        if self.state is None:
+            return None
+        if timestamp - self.last_accepted > MAX_COAST_TIME:
+            self.reset()
+            return None
+        return self.pose()
+
+    def pose(self):
+        """Return the current filtered Pose, or None if there is no track."""
+        if self.state is None:
+            return None
+        x, y, vx, vy, heading, heading_rate = self.state
+        return Pose(float(x), float(y), float(vx), float(vy), float(heading), float(heading_rate),
+                    self.length, self.timestamp)
+
+    def _start(self, measurement, length, timestamp):
+        if len(measurement) == 3:
+            heading, heading_variance = measurement[2], HEADING_MEASUREMENT_NOISE
+        else:
+            heading, heading_variance = 0.0, 8100.0
+        self.state = np.array([measurement[0], measurement[1], 0.0, 0.0, heading, 0.0])
+        self.covariance = np.diag([POSITION_MEASUREMENT_NOISE, POSITION_MEASUREMENT_NOISE, 2500.0, 2500.0,
+                                   heading_variance, 8100.0])
+        self.length = length if length is not None else 0.0
+        self.timestamp = timestamp
+        self.last_accepted = timestamp
+        self.rejected = 0
+
+    def _predict(self, timestamp):
+        dt = max(timestamp - self.timestamp, 0.0)
+        transition = np.eye(6)
+        transition[0, 2] = transition[1, 3] = transition[4, 5] = dt
+
+        # Piecewise white-noise acceleration model for each (value, rate) pair
+        block = np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]])
+        noise = np.zeros((6, 6))
+        for (i, j), spectral_density in (((0, 2), POSITION_ACCELERATION_NOISE),
+                                         ((1, 3), POSITION_ACCELERATION_NOISE),
+                                         ((4, 5), HEADING_ACCELERATION_NOISE)):
+            noise[np.ix_((i, j), (i, j))] = block * spectral_density
+
+        self.state = transition @ self.state
+        self.state[4] %= 360
+        self.covariance = transition @ self.covariance @ transition.T + noise
+        self.timestamp = timestamp
+
+    def _correct(self, measurement):
+        """Apply a measurement if it passes the gate; return whether it was accepted."""
+        rows = len(measurement)
+        matrix = MEASUREMENT_MATRIX[:rows]
+        innovation = measurement - matrix @ self.state
+        if rows == 3:
+            innovation[2] = normalize_angle(innovation[2])
+        innovation_covariance = matrix @ self.covariance @ matrix.T + MEASUREMENT_NOISE[:rows, :rows]
+        inverse = np.linalg.inv(innovation_covariance)
+        if innovation @ inverse @ innovation > GATE_THRESHOLDS[rows]:
+            return False
+
+        gain = self.covariance @ matrix.T @ inverse
+        self.state = self.state + gain @ innovation
+        self.state[4] %= 360
+        self.covariance = (np.eye(6) - gain @ matrix) @ self.covariance
+        return True
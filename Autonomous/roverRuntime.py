@@ -0,0 +1,84 @@
+import time
+
+CONTROL_RATE = 50  # control ticks per second
+STALE_AFTER = 0.5  # seconds without fresh telemetry before the rover is stopped
+REPORT_INTERVAL = 10.0  # seconds between timing reports
+
+
+class RoverRuntime:
+    """Run a rover's control at a fixed rate from the latest telemetry, whatever the network does.
+
+    source.latest() must return (state, local time of the camera frame it came from) of
+    the newest telemetry, or (None, None) before the first; udpTelemetry.TelemetryReceiver
+    (which only takes packets of newer frames) and cameraClient.StatePoller (which follows
+    the frame ids and ages the server reports) receive in their own threads and do. Every
+    1/rate seconds the tick calls control(state), or on_stale() when that frame is older
+    than stale_after, so a network stall or a camera that stopped producing frames stops
+    the motors instead of leaving them running. control returns False to end the run.
+
+    Ticks run on a fixed schedule. A tick that ends after the next one was due counts as
+    a deadline miss, and the schedule skips the ticks it overran rather than bursting.
+    """
+
+    def __init__(self, source, control, on_stale, rate=CONTROL_RATE, stale_after=STALE_AFTER):
+        self.source = source
+        self.control = control
+        self.on_stale = on_stale
+        self.period = 1.0 / rate
+        self.stale_after = stale_after
+        self.ticks = 0
+        self.deadline_misses = 0
+        self.skipped_ticks = 0
+        self.stale_ticks = 0
+        self.max_jitter = 0.0  # seconds a tick started after it was due
+        self.max_duration = 0.0  # seconds the longest tick took
+        self.stale = False
+
+    def run(self):
+        """Tick until control returns False."""
+        next_tick = time.monotonic()
+        next_report = next_tick + REPORT_INTERVAL
+        while True:
+            start = time.monotonic()
+            self.max_jitter = max(self.max_jitter, start - next_tick)
+            if not self.tick():
+                return
+
+            finished = time.monotonic()
+            self.max_duration = max(self.max_duration, finished - start)
+            next_tick += self.period
+            if finished > next_tick:
+                self.deadline_misses += 1
+                overrun = int((finished - next_tick) / self.period) + 1
+                self.skipped_ticks += overrun
+                next_tick += overrun * self.period
+            if finished >= next_report:
+                print(self.stats_text())
+                next_report = finished + REPORT_INTERVAL
+            time.sleep(max(next_tick - time.monotonic(), 0.0))
+
+    def tick(self):
+        """Run one control step on the latest telemetry; return False to stop."""
+        self.ticks += 1
+        state, captured_at = self.source.latest()
+        if state is None or time.time() - captured_at > self.stale_after:
+            self.stale_ticks += 1
+            if not self.stale:
+                self.stale = True
+                print("Telemetry stale; stopping until it is back")
+            self.on_stale()
+            return True
+        if self.stale:
+            self.stale = False
+            print("Telemetry back")
+        return self.control(state) is not False
+
+    def stats(self):
+        return {'ticks': self.ticks, 'deadline_misses': self.deadline_misses, 'skipped_ticks': self.skipped_ticks,
+                'stale_ticks': self.stale_ticks, 'max_jitter_ms': self.max_jitter * 1000,
+                'max_duration_ms': self.max_duration * 1000}
+
+    def stats_text(self):
+        return (f"Control: {self.ticks} ticks, {self.deadline_misses} deadline misses ({self.skipped_ticks} ticks skipped), "
+                f"{self.stale_ticks} stale, max jitter {self.max_jitter * 1000:.1f} ms, "
+                f"max tick {self.max_duration * 1000:.1f} ms")
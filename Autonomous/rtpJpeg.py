@@ -0,0 +1,309 @@
+import socket
+import struct
+import threading
+import time
+
+from frameSources import CapturedFrame, check_decode_scale, decode_jpeg
+
+RTP_PORT = 5000  # udpsink port of the gst-launch pipelines in Commands.txt
+RTP_JPEG_PAYLOAD_TYPE = 26  # static payload type of rtpjpegpay
+RECEIVE_BUFFER_BYTES = 4 * 1024 * 1024  # room for a few 720p frames of packets while the reader is busy
+MAX_PACKET_BYTES = 65536
+
+# RFC 2435 types: 0 is 4:2:2 and 1 is 4:2:0 YUV; 64-127 are the same with restart markers
+RESTART_TYPE_OFFSET = 64
+LUMA_SAMPLING = {0: 0x21, 1: 0x22}
+
+# Tables K.1 and K.2 of the JPEG standard in natural order, scaled by Q as in RFC 2435 appendix A
+LUMA_QUANTIZER = [
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+]
+CHROMA_QUANTIZER = [
+    17, 18, 24, 47, 99, 99, 99, 99,
+    18, 21, 26, 66, 99, 99, 99, 99,
+    24, 26, 56, 99, 99, 99, 99, 99,
+    47, 66, 99, 99, 99, 99, 99, 99,
+] + [99] * 32
+
+# DQT segments list coefficients in zigzag order: along anti-diagonals, alternating direction
+ZIGZAG = sorted(range(64), key=lambda k: (k // 8 + k % 8, k // 8 if (k // 8 + k % 8) % 2 else -(k // 8)))
+
+# Standard Huffman tables (JPEG annex K.3), as (table class and id, code counts, symbols)
+HUFFMAN_TABLES = [
+    (0x00, bytes([0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]), bytes(range(12))),
+    (0x10, bytes([0, 2, 1, 3, 3, 2, 4, 3, 5, 5, 4, 4, 0, 0, 1, 125]), bytes.fromhex(
+        '01020300041105122131410613516107227114328191a1082342b1c11552d1f024336272820'
+        '90a161718191a25262728292a3435363738393a434445464748494a535455565758595a6364'
+        '65666768696a737475767778797a838485868788898a92939495969798999aa2a3a4a5a6a7'
+        'a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7'
+        'e8e9eaf1f2f3f4f5f6f7f8f9fa')),
+    (0x01, bytes([0, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0]), bytes(range(12))),
+    (0x11, bytes([0, 2, 1, 2, 4, 4, 3, 4, 7, 5, 4, 4, 0, 1, 2, 119]), bytes.fromhex(
+        '000102031104052131061241510761711322328108144291a1b1c109233352f0156272d10a1'
+        '62434e125f11718191a262728292a35363738393a434445464748494a535455565758595a63'
+        '6465666768696a737475767778797a82838485868788898a92939495969798999aa2a3a4a5'
+        'a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae2e3e4e5e6'
+        'e7e8e9eaf2f3f4f5f6f7f8f9fa')),
+]
+
+
+def scaled_quantization_tables(q):
+    """Return the (luma, chroma) tables in zigzag order for an RFC 2435 Q factor from 1 to 99."""
+    factor = min(max(q, 1), 99)
+    scale = 5000 // factor if factor < 50 else 200 - factor * 2
+    tables = []
+    for table in (LUMA_QUANTIZER, CHROMA_QUANTIZER):
+        tables.append(bytes(min(max((table[k] * scale + 50) // 100, 1), 255) for k in ZIGZAG))
+    return tuple(tables)
+
+
+def _segment(marker, payload):
+    return struct.pack('>BBH', 0xFF, marker, len(payload) + 2) + payload
+
+
+def jpeg_headers(jpeg_type, width, height, tables, restart_interval=0):
+    """Build the JPEG headers (SOI up to SOS) that rtpjpegpay stripped from a frame."""
+    luma_table, chroma_table = tables
+    headers = [b'\xff\xd8',
+               _segment(0xDB, b'\x00' + luma_table),
+               _segment(0xDB, b'\x01' + chroma_table),
+               _segment(0xC0, struct.pack('>BHHB', 8, height, width, 3)
+                        + bytes([1, LUMA_SAMPLING[jpeg_type], 0, 2, 0x11, 1, 3, 0x11, 1]))]
+    if restart_interval:
+        headers.append(_segment(0xDD, struct.pack('>H', restart_interval)))
+    for table_id, counts, symbols in HUFFMAN_TABLES:
+        headers.append(_segment(0xC4, bytes([table_id]) + counts + symbols))
+    headers.append(_segment(0xDA, bytes([3, 1, 0x00, 2, 0x11, 3, 0x11, 0, 63, 0])))
+    return b''.join(headers)
+
+
+def parse_rtp(packet):
+    """Split an RTP packet into (marker, payload type, sequence, timestamp, SSRC, payload), or None if malformed."""
+    if len(packet) < 12 or packet[0] >> 6 != 2:
+        return None
+    csrc_count = packet[0] & 0x0F
+    marker = bool(packet[1] & 0x80)
+    payload_type = packet[1] & 0x7F
+    sequence, timestamp, ssrc = struct.unpack_from('>HII', packet, 2)
+    start = 12 + 4 * csrc_count
+    if packet[0] & 0x10:  # Header extension
+        if len(packet) < start + 4:
+            return None
+        start += 4 + 4 * struct.unpack_from('>H', packet, start + 2)[0]
+    end = len(packet)
+    if packet[0] & 0x20:  # Padding, its length in the last byte
+        end -= packet[-1]
+    if start > end:
+        return None
+    return marker, payload_type, sequence, timestamp, ssrc, packet[start:end]
+
+
+class JpegFrameAssembler:
+    """Reassemble RFC 2435 RTP/JPEG fragments into complete JPEG files.
+
+    Fragments are collected per RTP timestamp and placed by their fragment offset, so
+    reordered packets are fine. A frame is complete once the marker-bit packet arrived and
+    the fragments cover every byte up to it; a frame still missing pieces when a newer
+    timestamp shows up is dropped, as is anything older than the last completed frame.
+    """
+
+    def __init__(self, payload_type=RTP_JPEG_PAYLOAD_TYPE):
+        self.payload_type = payload_type
+        self.ssrc = None  # stream identifier; a restarted sender picks a new one
+        self.timestamp = None
+        self.fragments = {}  # fragment offset -> scan data
+        self.header = None  # (type, width, height, tables, restart interval) from the first fragment
+        self.end = None  # scan data length, known once the marker-bit packet is in
+        self.arrival = None  # local time the first packet of the frame arrived
+        self.last_completed = None
+        self.last_sequence = None  # highest sequence number seen
+        self.completed = 0
+        self.dropped = 0  # frames given up on because packets were lost
+        self.lost_packets = 0
+        self.cached_tables = {}  # Q 128-254 -> tables sent in-band earlier
+        self.unsupported = set()
+
+    def push(self, packet, arrival):
+        """Add one RTP packet; return (JPEG bytes, arrival time of the frame) when it completes a frame, else None."""
+        parsed = parse_rtp(packet)
+        if parsed is None:
+            return None
+        marker, payload_type, sequence, timestamp, ssrc, payload = parsed
+        if payload_type != self.payload_type or len(payload) < 8:
+            return None
+        if ssrc != self.ssrc:
+            # New or restarted sender: its sequence numbers and timestamps start afresh
+            self.ssrc = ssrc
+            self.last_sequence = None
+            self.last_completed = None
+            self._start(None, None)
+
+        # Count sequence gaps as lost, and take back the ones that turn up late
+        if self.last_sequence is not None:
+            step = (sequence - self.last_sequence) & 0xFFFF
+            if 0 < step < 0x8000:
+                self.lost_packets += step - 1
+                self.last_sequence = sequence
+            elif step:
+                self.lost_packets = max(self.lost_packets - 1, 0)
+        else:
+            self.last_sequence = sequence
+
+        if self.last_completed is not None and not self._newer(timestamp, self.last_completed):
+            return None  # Late packet of a frame already delivered or given up on
+        if timestamp != self.timestamp:
+            if self.timestamp is not None and self._newer(timestamp, self.timestamp):
+                self.dropped += 1
+            elif self.timestamp is not None:
+                return None  # Older than the frame being assembled
+            self._start(timestamp, arrival)
+
+        offset = int.from_bytes(payload[1:4], 'big')
+        jpeg_type, q, width, height = payload[4], payload[5], payload[6] * 8, payload[7] * 8
+        data = payload[8:]
+        restart_interval = 0
+        if jpeg_type >= RESTART_TYPE_OFFSET:
+            if len(data) < 4:
+                return None
+            restart_interval = struct.unpack_from('>H', data)[0]
+            data = data[4:]
+            jpeg_type -= RESTART_TYPE_OFFSET
+        if jpeg_type not in LUMA_SAMPLING:
+            if jpeg_type not in self.unsupported:
+                self.unsupported.add(jpeg_type)
+                print(f"Warning: unsupported RTP/JPEG type {jpeg_type}, frames dropped")
+            return None
+
+        if offset == 0:
+            if q >= 128:
+                tables, data = self._inline_tables(q, data)
+                if tables is None:
+                    return None
+            else:
+                tables = scaled_quantization_tables(q)
+            self.header = (jpeg_type, width, height, tables, restart_interval)
+
+        self.fragments[offset] = data
+        if marker:
+            self.end = offset + len(data)
+        return self._complete()
+
+    def _start(self, timestamp, arrival):
+        self.timestamp = timestamp
+        self.fragments = {}
+        self.header = None
+        self.end = None
+        self.arrival = arrival
+
+    def _inline_tables(self, q, data):
+        if len(data) < 4:
+            return None, data
+        precision, length = data[1], struct.unpack_from('>H', data, 2)[0]
+        tables_data, data = data[4:4 + length], data[4 + length:]
+        if length == 0:
+            return self.cached_tables.get(q), data
+        if precision or length not in (64, 128):
+            print("Warning: 16-bit or partial RTP/JPEG quantization tables are not supported")
+            return None, data
+        tables = (tables_data[:64], tables_data[-64:])
+        if q < 255:
+            self.cached_tables[q] = tables
+        return tables, data
+
+    def _complete(self):
+        if self.end is None or self.header is None:
+            return None
+        position = 0
+        for offset in sorted(self.fragments):
+            if offset != position:
+                return None  # Still waiting for a fragment (or one overlaps)
+            position += len(self.fragments[offset])
+        if position != self.end:
+            return None
+
+        scan = b''.join(self.fragments[offset] for offset in sorted(self.fragments))
+        jpeg = jpeg_headers(*self.header) + scan
+        if not scan.endswith(b'\xff\xd9'):
+            jpeg += b'\xff\xd9'
+        arrival = self.arrival
+        self.last_completed = self.timestamp
+        self.completed += 1
+        self._start(None, None)
+        return jpeg, arrival
+
+    @staticmethod
+    def _newer(timestamp, reference):
+        # RTP timestamps wrap at 32 bits
+        return 0 < (timestamp - reference) & 0xFFFFFFFF < 0x80000000
+
+
+class RtpJpegFrameSource:
+    """Frames from an RTP/JPEG stream (gst-launch ... ! rtpjpegpay ! udpsink), as a frame source.
+
+    A background thread reassembles frames as packets arrive and keeps only the newest
+    complete JPEG; read() decodes that one, at 1/scale of the sent resolution, so frames
+    nobody reads are never decoded. Timestamps are the arrival of a frame's first packet,
+    the closest local estimate of its capture time.
+    """
+
+    name = 'rtp'
+
+    def __init__(self, port=RTP_PORT, scale=1, payload_type=RTP_JPEG_PAYLOAD_TYPE):
+        check_decode_scale(scale)
+        self.port = port
+        self.scale = scale
+        self.assembler = JpegFrameAssembler(payload_type)
+        self.condition = threading.Condition()
+        self.sequence = 0  # bumped for every completed frame
+        self.latest = None  # (JPEG bytes, arrival time)
+        self.skipped = 0  # completed frames replaced before anyone read them
+        self.read_sequence = 0
+        self.thread = None
+
+    def start(self):
+        with self.condition:
+            if self.thread is None:
+                self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_BYTES)
+                self.socket.bind(('', self.port))
+                self.thread = threading.Thread(target=self._receive_loop, daemon=True)
+                self.thread.start()
+
+    def read(self, timeout=1.0):
+        """Return the next complete frame as a CapturedFrame, or None on timeout or an undecodable frame."""
+        self.start()
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence != self.read_sequence, timeout=timeout)
+            if self.sequence == self.read_sequence:
+                return None
+            self.skipped += self.sequence - self.read_sequence - 1
+            self.read_sequence = self.sequence
+            jpeg, timestamp = self.latest
+
+        frame = decode_jpeg(jpeg, self.scale)
+        if frame is None:
+            return None
+        return CapturedFrame(frame, timestamp, self.scale, jpeg)
+
+    def stats(self):
+        """Return frame and packet counters of the stream."""
+        assembler = self.assembler
+        return {'completed': assembler.completed, 'dropped': assembler.dropped,
+                'lost_packets': assembler.lost_packets, 'skipped': self.skipped}
+
+    def _receive_loop(self):
+        while True:
+            packet = self.socket.recv(MAX_PACKET_BYTES)
+            completed = self.assembler.push(packet, time.time())
+            if completed is not None:
+                with self.condition:
+                    self.latest = completed
+                    self.sequence += 1
+                    self.condition.notify_all()
@@ -0,0 +1,112 @@
+import math
+import time
+
+# Steering gains for a heading error in radians: full turn rate at about 1 rad (57 deg) off
+STEERING_KP = 1.0
+STEERING_KI = 0.1
+STEERING_KD = 0.05
+STEERING_SAMPLE_TIME = 0.05  # seconds; slower than the camera frame rate, so each sample sees fresh telemetry
+
+CRUISE_SPEED = 0.75  # wheel throttle when lined up with the target
+MIN_APPROACH_SPEED = 0.3  # fraction of the cruise speed kept right at the target, so the rover never stalls
+SLOWDOWN_DISTANCE = 100.0  # pixels from the target where the rover starts slowing down
+
+
+def normalize_angle(angle):
+    """Normalize angle to [-180, 180] degrees."""
+    return (angle + 180) % 360 - 180
+
+
+class PIDController:
+    """Discrete PID controller with the interface calibrationTip.txt describes.
+
+    update(error) recomputes the output at most once per sample_time seconds and returns
+    the last output in between. The output is clamped to output_limits, and the integral
+    only accumulates while the output is not saturated in the same direction, so it does
+    not wind up while the rover is turning as fast as it can.
+    """
+
+    def __init__(self, Kp, Ki=0.0, Kd=0.0, sample_time=0.1, output_limits=(None, None)):
+        self.Kp = Kp
+        self.Ki = Ki
+        self.Kd = Kd
+        self.sample_time = sample_time
+        self.output_limits = output_limits
+        self.reset()
+
+    def reset(self):
+        """Forget the integral and the previous error, e.g. after a stop or a new target."""
+        self.integral = 0.0
+        self.last_error = None
+        self.last_time = None
+        self.output = 0.0
+
+    def update(self, error, now=None):
+        """Feed the current error (setpoint minus measurement) and return the control output."""
+        now = time.monotonic() if now is None else now
+        if self.last_time is not None and now - self.last_time < self.sample_time:
+            return self.output
+
+        dt = self.sample_time if self.last_time is None else now - self.last_time
+        derivative = 0.0 if self.last_error is None else (error - self.last_error) / dt
+        integral = self.integral + error * dt
+        output = self.Kp * error + self.Ki * integral + self.Kd * derivative
+
+        lower, upper = self.output_limits
+        if upper is not None and output > upper:
+            output = upper
+            if error < 0:
+                self.integral = integral
+        elif lower is not None and output < lower:
+            output = lower
+            if error > 0:
+                self.integral = integral
+        else:
+            self.integral = integral
+
+        self.last_error = error
+        self.last_time = now
+        self.output = output
+        return output
+
+
+def mix_differential(forward, turn, max_output=1.0):
+    """Blend a forward speed and a turn rate (positive turns right) into (left, right) wheel throttles.
+
+    When a wheel would exceed max_output both are scaled down together, so the turn keeps
+    its share instead of being clipped away.
+    """
+    left = forward + turn
+    right = forward - turn
+    scale = max(abs(left), abs(right), max_output) / max_output
+    return left / scale, right / scale
+
+
+class DifferentialDriveController:
+    """Steer towards a target with a turn rate from a PID on the heading error, while driving.
+
+    Forward speed falls with the cosine of the heading error, so the rover turns in place
+    when the target is behind it and curves towards it otherwise, and eases off within
+    SLOWDOWN_DISTANCE of the target.
+    """
+
+    def __init__(self, pid=None, cruise_speed=CRUISE_SPEED, slowdown_distance=SLOWDOWN_DISTANCE):
+        if pid is None:
+            pid = PIDController(Kp=STEERING_KP, Ki=STEERING_KI, Kd=STEERING_KD, sample_time=STEERING_SAMPLE_TIME,
+                                output_limits=(-1, 1))
+        self.pid = pid
+        self.cruise_speed = cruise_speed
+        self.slowdown_distance = slowdown_distance
+
+    def reset(self):
+        self.pid.reset()
+
+    def update(self, heading_error, distance=None, now=None):
+        """Return (left, right) wheel throttles for a heading error in degrees (positive: target to the right)."""
+        error = math.radians(normalize_angle(heading_error))
+        turn = self.pid.update(error, now)
+
+        forward = self.cruise_speed * max(math.cos(error), 0.0)
+        if distance is not None and self.slowdown_distance:
+            forward *= max(min(distance / self.slowdown_distance, 1.0), MIN_APPROACH_SPEED)
+        return mix_differential(forward, turn)
@@ -0,0 +1,73 @@
+import json
+import threading
+import time
+
+import requests
+
+EVENT_STREAM_MIMETYPE = 'text/event-stream'
+KEEPALIVE_INTERVAL = 1.0  # seconds without an event before the server sends a comment line
+RECONNECT_DELAY = 1.0  # seconds before reconnecting a dropped stream
+READ_TIMEOUT = 5.0  # seconds of silence (keepalives included) before the stream counts as dead
+
+
+def format_event(data, event_id=None):
+    """Encode data as one compact server-sent event."""
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines.append('data: ' + json.dumps(data, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventSubscriber:
+    """Follow a server-sent event stream of JSON events in a background thread.
+
+    The subscription is made once and re-established if it drops. Callers read the latest
+    event with latest(), or block for the next one with wait(). Each received event gets a
+    local sequence number, so streams without event ids work as well.
+    """
+
+    def __init__(self, url, session=None):
+        self.url = url
+        self.session = session or requests.Session()
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.event = None
+        self.received_at = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def latest(self):
+        """Return (sequence, event, local receive time) of the newest event; the event is None before the first."""
+        with self.condition:
+            return self.sequence, self.event, self.received_at
+
+    def wait(self, last_sequence, timeout=None):
+        """Block until an event newer than last_sequence arrives; return (sequence, event), or None on timeout."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence != last_sequence, timeout=timeout)
+            if self.sequence == last_sequence:
+                return None
+            return self.sequence, self.event
+
+    def _run(self):
+        while True:
+            try:
+                with self.session.get(self.url, stream=True, timeout=(3, READ_TIMEOUT)) as response:
+                    response.raise_for_status()
+                    data = []
+                    # chunk_size=None hands over each chunk as it arrives instead of filling a buffer
+                    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                        if line.startswith('data:'):
+                            data.append(line[5:].lstrip())
+                        elif line == '' and data:
+                            self._publish(json.loads('\n'.join(data)))
+                            data = []
+            except (requests.RequestException, ValueError) as e:
+                print(f"Event stream error: {e}. Reconnecting...")
+            time.sleep(RECONNECT_DELAY)
+
+    def _publish(self, event):
+        with self.condition:
+            self.sequence += 1
+            self.event = event
+            self.received_at = time.time()
+            self.condition.notify_all()
@@ -0,0 +1,184 @@
+import math
+import socket
+import struct
+import threading
+import time
+from collections import namedtuple
+
+TELEMETRY_PORT = 12346
+MULTICAST_PORT = 12347  # separate, so a receiver on the camera Pi itself does not clash with the sender
+MULTICAST_TTL = 1  # keep multicast telemetry on the local network
+
+# Fixed-size little-endian packet: magic, version, action code, sequence, capture timestamp,
+# then red x/y, blue x/y, center x/y, heading, distance and angle as float32 (NaN if unknown)
+PACKET_FORMAT = '<2sBBId9f'
+PACKET_SIZE = struct.calcsize(PACKET_FORMAT)
+PACKET_MAGIC = b'FT'
+PACKET_VERSION = 1
+
+# Datagram a rover sends to the camera's telemetry port to (re)subscribe
+SUBSCRIBE_MESSAGE = b'FSUB'
+SUBSCRIBE_INTERVAL = 1.0  # seconds between a receiver's subscription renewals
+SUBSCRIPTION_TIMEOUT = 5.0  # seconds after the last renewal before the sender forgets a rover
+REORDER_WINDOW = 5  # packets up to this many frames older than the latest are late or duplicate, not a restart
+
+ACTIONS = [None, 'forward', 'left', 'right', 'stop', 'error']
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+# One decoded packet; points are (x, y) tuples or None, numbers are None if unknown
+Telemetry = namedtuple('Telemetry', ['sequence', 'timestamp', 'red', 'blue', 'center', 'heading', 'distance',
+                                     'angle', 'action'])
+
+
+def _number(value):
+    return math.nan if value is None else value
+
+
+def _point(point):
+    return (math.nan, math.nan) if point is None else point
+
+
+def _optional(value):
+    return None if math.isnan(value) else value
+
+
+def pack_telemetry(sequence, timestamp, red, blue, center, heading, distance, angle, action):
+    """Encode one telemetry packet."""
+    return struct.pack(PACKET_FORMAT, PACKET_MAGIC, PACKET_VERSION, ACTION_CODES.get(action, 0),
+                       sequence & 0xFFFFFFFF, timestamp, *_point(red), *_point(blue), *_point(center),
+                       _number(heading), _number(distance), _number(angle))
+
+
+def unpack_telemetry(packet):
+    """Decode a telemetry packet, or return None if it is not one."""
+    if len(packet) != PACKET_SIZE:
+        return None
+    magic, version, action, sequence, timestamp, *values = struct.unpack(PACKET_FORMAT, packet)
+    if magic != PACKET_MAGIC or version != PACKET_VERSION or action >= len(ACTIONS):
+        return None
+    red_x, red_y, blue_x, blue_y, center_x, center_y, heading, distance, angle = values
+    red = None if math.isnan(red_x) else (red_x, red_y)
+    blue = None if math.isnan(blue_x) else (blue_x, blue_y)
+    center = None if math.isnan(center_x) else (center_x, center_y)
+    return Telemetry(sequence, timestamp, red, blue, center, _optional(heading), _optional(distance),
+                     _optional(angle), ACTIONS[action])
+
+
+class TelemetrySender:
+    """Camera side: send a telemetry packet per frame to every subscribed rover, and optionally to a multicast group.
+
+    Rovers subscribe by sending SUBSCRIBE_MESSAGE to the telemetry port from the socket they
+    listen on, and must renew within SUBSCRIPTION_TIMEOUT. Sending never blocks; a packet
+    that cannot be sent is simply lost, like any other UDP packet.
+    """
+
+    def __init__(self, port=TELEMETRY_PORT, multicast_group=None, multicast_port=MULTICAST_PORT):
+        self.multicast_address = None if multicast_group is None else (multicast_group, multicast_port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(('', port))
+        if multicast_group is not None:
+            self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+        self.lock = threading.Lock()
+        self.subscribers = {}  # address -> time of the last subscription
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def send(self, packet):
+        now = time.time()
+        with self.lock:
+            for address, seen in list(self.subscribers.items()):
+                if now - seen > SUBSCRIPTION_TIMEOUT:
+                    del self.subscribers[address]
+            addresses = list(self.subscribers)
+        if self.multicast_address is not None:
+            addresses.append(self.multicast_address)
+        for address in addresses:
+            try:
+                self.socket.sendto(packet, address)
+            except OSError:
+                pass  # Unreachable right now; the next frame's packet supersedes this one anyway
+
+    def _listen(self):
+        while True:
+            try:
+                message, address = self.socket.recvfrom(64)
+            except OSError:
+                continue
+            if message == SUBSCRIBE_MESSAGE:
+                with self.lock:
+                    if address not in self.subscribers:
+                        print(f"Telemetry subscriber: {address[0]}:{address[1]}")
+                    self.subscribers[address] = time.time()
+
+
+class TelemetryReceiver:
+    """Rover side: keep the latest telemetry packet from the camera in a background thread.
+
+    With camera_host set, it subscribes for unicast packets and renews the subscription every
+    SUBSCRIBE_INTERVAL; with multicast_group set it joins the group instead. Duplicate
+    packets and late ones (sequence at most REORDER_WINDOW behind the latest) are
+    ignored; a sequence further behind means the camera server restarted and is taken.
+    """
+
+    def __init__(self, camera_host=None, port=TELEMETRY_PORT, multicast_group=None, multicast_port=MULTICAST_PORT):
+        self.camera_address = None if camera_host is None else (camera_host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if multicast_group is not None:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind(('', multicast_port))
+            membership = struct.pack('4s4s', socket.inet_aton(multicast_group), socket.inet_aton('0.0.0.0'))
+            self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        else:
+            self.socket.bind(('', 0))
+        self.socket.settimeout(SUBSCRIBE_INTERVAL)
+        self.condition = threading.Condition()
+        self.telemetry = None
+        self.received_at = None
+        threading.Thread(target=self._receive, daemon=True).start()
+
+    def latest(self):
+        """Return (Telemetry, local receive time) of the newest packet, or (None, None) before the first."""
+        with self.condition:
+            return self.telemetry, self.received_at
+
+    def wait(self, last_sequence, timeout=None):
+        """Block until a packet newer than last_sequence arrives; return it, or None on timeout."""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.telemetry is not None and self.telemetry.sequence != last_sequence, timeout=timeout)
+            if self.telemetry is None or self.telemetry.sequence == last_sequence:
+                return None
+            return self.telemetry
+
+    def _subscribe(self):
+        if self.camera_address is not None:
+            try:
+                self.socket.sendto(SUBSCRIBE_MESSAGE, self.camera_address)
+            except OSError as e:
+                print(f"Telemetry subscription failed: {e}")
+
+    def _receive(self):
+        self._subscribe()
+        last_subscription = time.time()
+        while True:
+            if time.time() - last_subscription >= SUBSCRIBE_INTERVAL:
+                self._subscribe()
+                last_subscription = time.time()
+            try:
+                packet, _ = self.socket.recvfrom(PACKET_SIZE + 1)
+            except socket.timeout:
+                continue
+            except OSError:
+                time.sleep(SUBSCRIBE_INTERVAL)
+                continue
+            telemetry = unpack_telemetry(packet)
+            if telemetry is None:
+                continue
+            with self.condition:
+                # Sequence numbers restart with the camera server, so only a small step back is reordering
+                if self.telemetry is not None \
+                        and (self.telemetry.sequence - telemetry.sequence) & 0xFFFFFFFF <= REORDER_WINDOW:
+                    continue
+                self.telemetry = telemetry
+                self.received_at = time.time()
+                self.condition.notify_all()
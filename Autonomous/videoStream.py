@@ -0,0 +1,274 @@
+import queue
+import socket
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+SUBSCRIBER_QUEUE_SIZE = 2  # encoded frames buffered per client before the oldest is dropped
+SEND_BUFFER_BYTES = 32 * 1024  # kernel send buffer of a stream socket (Linux doubles it), instead of auto-tuned megabytes
+MJPEG_MIMETYPE = 'multipart/x-mixed-replace; boundary=frame'
+
+# Quality ladder a client moves along, from the weak-link to the full-quality settings.
+# Width is the largest frame width sent (the aspect ratio is kept, frames are never upscaled).
+StreamLevel = namedtuple('StreamLevel', ['width', 'quality', 'fps'])
+STREAM_LEVELS = [
+    StreamLevel(320, 10, 10),
+    StreamLevel(640, 30, 15),
+    StreamLevel(960, 40, 20),
+    StreamLevel(1280, 50, 30),
+]
+DEFAULT_START_LEVEL = 1
+
+# Single level of passthrough streams, whose frames already are the camera's JPEGs: only the
+# frame rate applies, and the quality is for frames that have to be encoded after all
+PASSTHROUGH_LEVELS = [StreamLevel(None, 70, 30)]
+
+# Adaptation: step down as soon as a client falls behind, and probe the next level up after it
+# has kept up for a while without the link being the bottleneck
+DOWNGRADE_HOLD = 0.5  # seconds at a level before stepping down again
+UPGRADE_HOLD = 3.0  # seconds at a level without drops before stepping up
+MAX_UPGRADE_HOLD = 48.0  # seconds the hold doubles up to after each failed step up
+THROUGHPUT_SMOOTHING = 0.2  # weight of a new send-rate measurement
+FPS_SLACK = 0.9  # accept frames this much early so capture jitter does not halve the rate
+THROUGHPUT_SAMPLE_BYTES = 4 * SEND_BUFFER_BYTES  # bytes per measurement, well over what the send buffer can hide
+THROUGHPUT_SAMPLE_TIME = 1.0  # seconds that also complete a measurement, for small frames and slow links
+SATURATED_SEND_FRACTION = 0.5  # share of a measurement spent blocked in sends that marks the link as the bottleneck
+
+
+class Subscriber:
+    """One streaming client: its quality level, send statistics and a bounded queue that drops the oldest frame."""
+
+    def __init__(self, level, min_level, max_level, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.level = level
+        self.min_level = min_level
+        self.max_level = max_level
+        self.dropped = 0
+        self.throughput = None  # bytes per second delivered to the connection
+        self.saturated = None  # whether sends blocked for most of the last measurement at this level
+        self.sample_bytes = 0
+        self.sample_seconds = 0.0
+        self.sample_start = None
+        self.warmed_up = False  # the first measurement only fills the buffers and is discarded
+        self.last_offer = 0.0
+        self.last_change = time.time()
+        self.drops_at_change = 0
+        self.upgrade_hold = UPGRADE_HOLD
+        self.probing = False  # on a level stepped up to, not yet shown to be sustainable
+
+    def offer(self, jpeg, now):
+        """Queue a frame without ever blocking the producer."""
+        self.last_offer = now
+        while True:
+            try:
+                self.frames.put_nowait(jpeg)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def next_due(self, levels):
+        """Return the time from which this client's frame rate allows another frame."""
+        return self.last_offer + FPS_SLACK / levels[self.level].fps
+
+    def due(self, now, levels):
+        """Return whether this client's frame rate allows another frame now."""
+        return now >= self.next_due(levels)
+
+    def record_send(self, size, seconds, now):
+        """Add one frame's send to the current measurement, and update the throughput when it is complete.
+
+        Sends alternate between filling free buffer space at once and blocking while it
+        drains, so single sends say little; a measurement spans several buffers' worth of
+        wall-clock time, waits for the next frame included, and its rate is the bytes over
+        that time. This is the rate the client is being served at, which only equals the
+        link's capacity when sends blocked for most of the measurement; saturated records
+        whether they did.
+        """
+        if self.sample_start is None:
+            self.sample_start = now - seconds
+        self.sample_bytes += size
+        self.sample_seconds += seconds
+        duration = now - self.sample_start
+        if self.sample_bytes < THROUGHPUT_SAMPLE_BYTES and duration < THROUGHPUT_SAMPLE_TIME:
+            return
+        if self.warmed_up:
+            rate = self.sample_bytes / duration
+            self.saturated = self.sample_seconds >= SATURATED_SEND_FRACTION * duration
+            if self.throughput is None:
+                self.throughput = rate
+            else:
+                self.throughput += THROUGHPUT_SMOOTHING * (rate - self.throughput)
+        self.sample_bytes, self.sample_seconds = 0, 0.0
+        self.sample_start = now
+        self.warmed_up = True
+
+    def set_level(self, level, now):
+        self.level = level
+        self.last_change = now
+        self.drops_at_change = self.dropped
+        self.saturated = None
+
+
+def limit_send_buffer(sock, size=SEND_BUFFER_BYTES):
+    """Cap the kernel send buffer of a client socket (None is ignored).
+
+    With the default auto-tuning the kernel accepts seconds of frames on a weak link, so a
+    send returns long before the frame is delivered. With a small buffer a send blocks
+    while the link drains, frames wait in the subscriber queue where they can be dropped,
+    and the send time measures the link.
+    """
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
+    except OSError as e:
+        print(f"Could not limit the stream send buffer: {e}")
+
+
+class MjpegBroadcaster:
+    """Render each new frame once and fan JPEGs out to every client at its own quality level.
+
+    next_frame(last_frame_id) must block until a frame newer than last_frame_id is ready and
+    return (frame_id, BGR image or JPEG bytes), or None on timeout; it is only called once some
+    client's frame rate allows another frame. JPEG bytes are sent as they are. Each image is
+    resized and encoded once per level that some client is on, so clients on the same level
+    share the bytes. A client drops a level when its queue overflows or its saturated
+    connection absorbs less than its level's bitrate, and tries the next level up after
+    UPGRADE_HOLD seconds without drops or saturation, waiting twice as long after each try
+    that fails. The producer thread only runs while someone is subscribed.
+    """
+
+    def __init__(self, next_frame, levels=STREAM_LEVELS, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.next_frame = next_frame
+        self.levels = levels
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.thread = None
+
+    def subscribe(self, level=DEFAULT_START_LEVEL, min_level=0, max_level=None):
+        max_level = len(self.levels) - 1 if max_level is None else min(max(max_level, 0), len(self.levels) - 1)
+        min_level = min(max(min_level, 0), max_level)
+        subscriber = Subscriber(min(max(level, min_level), max_level), min_level, max_level, self.queue_size)
+        with self.lock:
+            self.subscribers.add(subscriber)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def stream(self, level=DEFAULT_START_LEVEL, min_level=0, max_level=None, timeout=1.0, sock=None):
+        """Yield multipart MJPEG parts for one client until it disconnects, adapting its level as it goes.
+
+        sock is the client's socket, if the server exposes it; its send buffer is capped
+        with limit_send_buffer so the throughput measurement sees the link.
+        """
+        limit_send_buffer(sock)
+        subscriber = self.subscribe(level, min_level, max_level)
+        try:
+            while True:
+                try:
+                    jpeg = subscriber.frames.get(timeout=timeout)
+                except queue.Empty:
+                    continue
+                # The server writes the part before resuming the generator, so this times the send;
+                # with the capped send buffer that lasts until most of the frame has left
+                start = time.time()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+                sent = time.time()
+                subscriber.record_send(len(jpeg), sent - start, sent)
+                self._adapt(subscriber, len(jpeg))
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        """Return the level, throughput and drop count of every client."""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        return [{'level': subscriber.level, **self.levels[subscriber.level]._asdict(),
+                 'throughput_kbps': None if subscriber.throughput is None else subscriber.throughput * 8 / 1000,
+                 'saturated': subscriber.saturated,
+                 'dropped': subscriber.dropped, 'queued': subscriber.frames.qsize()}
+                for subscriber in subscribers]
+
+    def _adapt(self, subscriber, frame_size):
+        now = time.time()
+        held = now - subscriber.last_change
+        level = self.levels[subscriber.level]
+        # Below the level's bitrate only counts while the link is the bottleneck; otherwise the
+        # camera may simply deliver fewer frames than the level allows
+        congested = subscriber.dropped > subscriber.drops_at_change \
+            or (subscriber.saturated and subscriber.throughput < frame_size * level.fps)
+
+        if congested:
+            if subscriber.level > subscriber.min_level and held >= DOWNGRADE_HOLD:
+                if subscriber.probing:
+                    # The step up failed; wait longer before trying it again
+                    subscriber.upgrade_hold = min(2 * subscriber.upgrade_hold, MAX_UPGRADE_HOLD)
+                subscriber.probing = False
+                subscriber.set_level(subscriber.level - 1, now)
+            return
+
+        if subscriber.probing and held >= UPGRADE_HOLD:
+            subscriber.probing = False
+            subscriber.upgrade_hold = UPGRADE_HOLD
+
+        # The served rate cannot show spare capacity, so probe: a level the link cannot carry
+        # saturates it or overflows the queue, and is left again after DOWNGRADE_HOLD
+        if subscriber.level < subscriber.max_level and held >= subscriber.upgrade_hold \
+                and subscriber.saturated is False:
+            subscriber.probing = True
+            subscriber.set_level(subscriber.level + 1, now)
+
+    def _encode(self, image, level):
+        if isinstance(image, bytes):
+            return image  # Already compressed: pass through untouched
+        width = image.shape[1]
+        if level.width is not None and width > level.width:
+            height = round(image.shape[0] * level.width / width)
+            image = cv2.resize(image, (level.width, height), interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, level.quality])
+        return buffer.tobytes() if ret else None
+
+    def _run(self):
+        last_frame_id = None
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    return
+                subscribers = list(self.subscribers)
+
+            # Only render when some client will take the frame, so slow clients do not cost renders
+            wait = min(subscriber.next_due(self.levels) for subscriber in subscribers) - time.time()
+            if wait > 0:
+                time.sleep(wait)
+                continue
+
+            rendered = self.next_frame(last_frame_id)
+            if rendered is None:
+                continue
+            last_frame_id, image = rendered
+
+            # Encode once for each level a client is ready for
+            now = time.time()
+            encoded = {}
+            for subscriber in subscribers:
+                if not subscriber.due(now, self.levels):
+                    continue
+                level = subscriber.level
+                if level not in encoded:
+                    encoded[level] = self._encode(image, self.levels[level])
+                if encoded[level] is not None:
+                    subscriber.offer(encoded[level], now)
@@ -1,10 +1,16 @@
 import time
 import math
+import os
+import sys
 from adafruit_motorkit import MotorKit
 import requests
 from bs4 import BeautifulSoup
 import json
 
+# The map calibration lives with the camera code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Autonomous'))
+from mapCalibration import load_calibration
+
 kit = MotorKit()
 
 TIME_PER_360 = 1.6
@@ -15,16 +21,11 @@ KP_STEERING = 0.5
 TIME_PER_FOOT = 0.54
 SPEED = 0.75
 
-MAP_WIDTH_INCHES = 142
-MAP_HEIGHT_INCHES = 92
-
 targets = [(14.5, 16), (16.5, 16), (19.5, 16), (22.5, 16), (34, 16), (38, 10.5), (46, 7.8), (53, 12), (59, 13.5), (60.5, 18.5)]
 current_pos = (9.7, 12.5)
 
-TOP_LEFT_PIXEL = (58, 23) # (58, 469)
-TOP_RIGHT_PIXEL = (760, 23) # (58, 23)
-BOTTOM_LEFT_PIXEL = (58, 469) # (760, 469)
-BOTTOM_RIGHT_PIXEL = (760, 469) # (760, 23)
+# Pixel -> inches homography (run Autonomous/mapCalibration.py to write map_calibration.json)
+calibration = load_calibration()
 
 current_direction = (180, 1.0)
 
@@ -94,16 +95,9 @@ def update_position():
     # Get the current pixel position
     current_pixel = get_current_pixel()
     print(f"Current pixel: {current_pixel}")
-    pixel_x, pixel_y = current_pixel
-
-    # Calculate the scale factors
-    scale_x = MAP_WIDTH_INCHES / (TOP_RIGHT_PIXEL[0] - TOP_LEFT_PIXEL[0])
-    scale_y = MAP_HEIGHT_INCHES / (BOTTOM_LEFT_PIXEL[1] - TOP_LEFT_PIXEL[1])
-    print(f"Scale: {scale_x}, {scale_y}")
 
-    # Convert pixel position to inches
-    x_inches = (pixel_x - TOP_LEFT_PIXEL[0]) * scale_x
-    y_inches = (pixel_y - TOP_LEFT_PIXEL[1]) * scale_y
+    # Convert pixel position to inches, correcting for the camera's perspective
+    x_inches, y_inches = calibration.pixel_to_world(current_pixel)
     print(f"Inches: {x_inches}, {y_inches}")
 
     # Calculate the distance from the previous position
@@ -1,4 +1,6 @@
 import cv2
+import json
+import threading
 import numpy as np
 from flask import Flask, Response, render_template, jsonify, render_template_string
 
@@ -6,10 +8,12 @@ app = Flask(__name__)
 
 # Initialize with default values
 LIGHT_POSITION = (0, 0)
+position_id = 0  # Incremented on every update so /events can push each one once
+position_condition = threading.Condition()
 
 
 def generate_frames():
-    global LIGHT_POSITION  # Move this up here to ensure proper scope
+    global LIGHT_POSITION, position_id  # Move this up here to ensure proper scope
     cap = cv2.VideoCapture(0)
 
     if not cap.isOpened():
@@ -34,7 +38,10 @@ def generate_frames():
             cv2.circle(frame, (center_x, center_y), 5, (0, 255, 0), -1)
 
             # Update position - place outside the yield
-            LIGHT_POSITION = (center_x, center_y)
+            with position_condition:
+                LIGHT_POSITION = (center_x, center_y)
+                position_id += 1
+                position_condition.notify_all()
             print(f"Light position updated: {LIGHT_POSITION}")
 
         ret, buffer = cv2.imencode('.jpg', frame)
@@ -63,16 +70,12 @@ def index():
             <div class="coordinates">Position: <span id="coords">{{ x }}, {{ y }}</span></div>
 
             <script>
-                function updateCoordinates() {
-                    fetch('/light_position')
-                        .then(response => response.json())
-                        .then(data => {
-                            document.getElementById('coords').textContent = data.x + ', ' + data.y;
-                        });
-                }
-
-                // Update coordinates every second instead of page reload
-                setInterval(updateCoordinates, 500);
+                // The server pushes every position update; EventSource reconnects by itself
+                const events = new EventSource('/events');
+                events.onmessage = function(message) {
+                    const data = JSON.parse(message.data);
+                    document.getElementById('coords').textContent = data.x + ', ' + data.y;
+                };
             </script>
         </body>
         </html>
@@ -84,6 +87,27 @@ def video_feed():
     return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
+def generate_events():
+    last_id = None
+    while True:
+        with position_condition:
+            position_condition.wait_for(lambda: position_id != last_id, timeout=1.0)
+            changed = position_id != last_id
+            if changed:
+                last_id = position_id
+                x, y = LIGHT_POSITION
+        # Yield outside the lock, so a slow client never holds up generate_frames
+        if not changed:
+            yield ': keepalive\n\n'
+            continue
+        yield f'id: {last_id}\ndata: {json.dumps({"x": x, "y": y})}\n\n'
+
+
+@app.route('/events')
+def events():
+    return Response(generate_events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
 @app.route('/light_position')
 def light_position():
     global LIGHT_POSITION
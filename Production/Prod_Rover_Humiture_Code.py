@@ -1,16 +1,21 @@
 import csv
+import os
+import sys
 import time
-import requests
 import board
 import adafruit_dht
 import smbus
 from datetime import datetime
 
+# The telemetry subscriber lives with the rover code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Autonomous'))
+from telemetryEvents import EventSubscriber
+
 # Constants
 DHT_PIN = board.D26  # GPIO pin for DHT11
 PCF8591_ADDRESS = 0x48  # Default I2C address of PCF8591
 ADC_CHANNEL = 0  # MQ2 gas sensor connected to AIN0
-JSON_URL = "http://192.168.0.100:5000/light_position"  # Replace with actual endpoint
+EVENTS_URL = "http://192.168.0.100:5000/events"  # Replace with actual endpoint
 CSV_FILE = "sensor_data.csv"
 
 # Initialize DHT11 Sensor
@@ -19,6 +24,9 @@ dht_device = adafruit_dht.DHT11(DHT_PIN)
 # Initialize I2C for PCF8591
 bus = smbus.SMBus(1)  # Use I2C bus 1
 
+# Subscribe once to the position pushes instead of polling
+telemetry = EventSubscriber(EVENTS_URL)
+
 
 def read_adc(channel):
     """Read analog value from PCF8591 ADC."""
@@ -49,20 +57,18 @@ def get_sensor_data():
     return temperature, humidity, gas_value
 
 
-def fetch_json_data():
-    """Fetch (x, y) coordinates from JSON endpoint."""
-    try:
-        response = requests.get(JSON_URL, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        if "position" in data and isinstance(data["position"], list) and len(data["position"]) == 2:
-            return data["position"][0], data["position"][1]
-        else:
-            print("Invalid JSON format")
-            return None, None
-    except requests.RequestException as e:
-        print(f"Error fetching JSON: {e}")
-        return None, None
+def fetch_json_data(last_sequence):
+    """Wait for the next pushed (x, y) position; return it with its sequence number."""
+    received = telemetry.wait(last_sequence, timeout=5)
+    if received is None:
+        print("No position update received")
+        return last_sequence, None, None
+    sequence, data = received
+    if "x" in data and "y" in data:
+        return sequence, data["x"], data["y"]
+    else:
+        print("Invalid JSON format")
+        return sequence, None, None
 
 
 def write_to_csv(data):
@@ -82,9 +88,10 @@ def write_to_csv(data):
 
 
 def main():
+    sequence = 0
     while True:
+        sequence, x, y = fetch_json_data(sequence)
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        x, y = fetch_json_data()
         temp, humidity, gas = get_sensor_data()
 
         if x is not None and y is not None:
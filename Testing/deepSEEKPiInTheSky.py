@@ -1,6 +1,7 @@
 import cv2
 import numpy as np
 from flask import Flask, jsonify, request, Response
+from werkzeug.serving import WSGIRequestHandler
 import math
 import time
 
@@ -50,20 +51,45 @@ def get_signed_angle_difference(angle1, angle2):
     return diff
 
 
-def find_most_dominant_pixel(channel, other_channels, color_name):
-    # Calculate a dominance score: how much the target channel exceeds the sum of others
-    dominance = channel.astype(float) - (other_channels[0].astype(float) + other_channels[1].astype(float))
+# Reusable int16 buffers for the dominance kernel, keyed by frame shape
+_dominance_buffers = {}
 
-    # Find the maximum dominance score
-    max_dominance = np.max(dominance)
 
-    # If the maximum dominance is below the threshold, return None
-    if max_dominance < DOMINANCE_THRESHOLD:
-        return None
+def find_dominant_pixels(frame):
+    """Return the (x, y) of the most red-dominant and most blue-dominant pixels in a BGR frame.
+
+    Both dominance maps are computed together in int16 into buffers that are reused between
+    frames. Since red dominance is (R - B) - G and blue dominance is -(R - B) - G, the
+    shared R - B and G terms are only computed once.
+    """
+    shape = frame.shape[:2]
+    buffers = _dominance_buffers.get(shape)
+    if buffers is None:
+        buffers = tuple(np.empty(shape, dtype=np.int16) for _ in range(3))
+        _dominance_buffers[shape] = buffers
+    red_dominance, blue_dominance, green = buffers
+
+    # OpenCV frames are BGR, so index the channels directly instead of converting to RGB
+    blue_channel = frame[:, :, 0]
+    green_channel = frame[:, :, 1]
+    red_channel = frame[:, :, 2]
+
+    np.subtract(red_channel, blue_channel, out=blue_dominance, dtype=np.int16)  # R - B
+    np.copyto(green, green_channel, casting='unsafe')
+    np.subtract(blue_dominance, green, out=red_dominance)  # R - G - B
+    np.add(blue_dominance, green, out=blue_dominance)
+    np.negative(blue_dominance, out=blue_dominance)  # B - R - G
+
+    return _dominant_location(red_dominance), _dominant_location(blue_dominance)
 
-    # Find the pixel with the highest dominance score
-    y, x = np.unravel_index(np.argmax(dominance), dominance.shape)
-    return (x, y)  # Return coordinates (x, y)
+
+def _dominant_location(dominance):
+    """Return the (x, y) of the highest dominance score, or None if it is below the threshold."""
+    index = np.argmax(dominance)
+    y, x = np.unravel_index(index, dominance.shape)
+    if dominance[y, x] < DOMINANCE_THRESHOLD:
+        return None
+    return (int(x), int(y))  # Return coordinates (x, y)
 
 def normalize_angle(angle):
     """Normalize angle to [-180, 180] degrees."""
@@ -119,17 +145,8 @@ def process_frame():
         print("Error: Failed to capture frame.")
         return None, None, None
 
-    # Convert BGR (OpenCV default) to RGB
-    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-    # Split the frame into R, G, B channels
-    red_channel = frame_rgb[:, :, 0]
-    green_channel = frame_rgb[:, :, 1]
-    blue_channel = frame_rgb[:, :, 2]
-
-    # Find the pixel with the most dominant red and blue values
-    red_pixel = find_most_dominant_pixel(red_channel, (green_channel, blue_channel), "red")
-    blue_pixel = find_most_dominant_pixel(blue_channel, (red_channel, green_channel), "blue")
+    # Find the pixels with the most dominant red and blue values in a single pass
+    red_pixel, blue_pixel = find_dominant_pixels(frame)
 
     # Apply smoothing to red position if a valid red pixel is found
     if red_pixel is not None:
@@ -304,4 +321,6 @@ def get_action():
 
 
 if __name__ == '__main__':
+    # HTTP/1.1 keeps the rover's connection open between requests (HTTP/1.0 closes each one)
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
     app.run(host='0.0.0.0', port=12345)
\ No newline at end of file
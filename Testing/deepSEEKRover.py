@@ -1,25 +1,36 @@
-import time
+import os
+import sys
 import math
 from adafruit_motorkit import MotorKit
-import requests
-import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Autonomous'))
+from cameraClient import CameraClient, StatePoller
+from roverRuntime import RoverRuntime
+from steeringControl import DifferentialDriveController
 
 # Initialize motor kit
 kit = MotorKit()
 
 # Rover-specific constants (independent from camera)
-ANGLE_TOLERANCE = 20.0  # degrees
+ANGLE_TOLERANCE = 20.0  # degrees of heading error logged as turning rather than driving
 POSITION_TOLERANCE = 20.0  # pixels (matches camera's PIXEL_TOLERANCE)
 SPEED = 0.75  # Default motor speed (-1.0 to 1.0)
-KP_STEERING = 0.02  # Proportional gain for steering
-STEP_TIME = 0.1  # Time per movement step (seconds)
 
 # Roverâs independent target list
 targets = [(370, 173), (305, 170), (230, 179)]
+target_index = 0
+last_mode = None
+
+# Proportional steering towards the current target (gains in steeringControl)
+steering = DifferentialDriveController(cruise_speed=SPEED)
 
 # Camera server URL (replace with your camera Pi's IP)
 CAMERA_URL = 'http://192.168.0.124:5000'
 
+# One kept-alive connection to the camera server, polled in the background so the
+# control loop only ever reads the latest markers
+camera = CameraClient(CAMERA_URL, warm_path='/markers')
+
 # Motor control functions
 def forward(speed=SPEED):
     """Move the rover forward at the specified speed."""
@@ -46,26 +57,24 @@ def stop():
     kit.motor1.throttle = 0
     kit.motor2.throttle = 0
 
-def get_markers(target_index):
-    """Fetch red and blue pixel coordinates from the camera server."""
-    while True:
-        try:
-            response = requests.get(f'{CAMERA_URL}/markers', timeout=1)
-            if response.status_code != 200:
-                print(f"HTTP {response.status_code}. Retrying...")
-                time.sleep(0.1)
-                continue
-            data = response.json()
-            red = data.get('red')
-            blue = data.get('blue')
-            if red is None or blue is None:
-                print("Markers not detected. Retrying...")
-                time.sleep(0.1)
-                continue
-            return (red['x'], red['y']), (blue['x'], blue['y'])
-        except (requests.RequestException, json.JSONDecodeError) as e:
-            print(f"Error fetching markers: {e}. Retrying...")
-            time.sleep(0.1)
+def set_wheels(left_speed, right_speed):
+    """Drive each wheel at its own speed, positive forward (-1.0 to 1.0)."""
+    kit.motor1.throttle = -left_speed  # Wheel that drives backward in left()
+    kit.motor2.throttle = right_speed  # Wheel that drives forward in left()
+
+def halt():
+    """Stop the rover and forget the steering history, so it restarts cleanly."""
+    stop()
+    steering.reset()
+
+def parse_markers(data):
+    """Turn a /markers response into (red pixel, blue pixel); either is None when not detected."""
+    red = data.get('red')
+    blue = data.get('blue')
+    return (None if red is None else (red['x'], red['y']),
+            None if blue is None else (blue['x'], blue['y']))
+
+marker_poller = StatePoller(camera, '/markers', parse=parse_markers)
 
 def calculate_center(point1, point2):
     """Calculate the center point between two points (matches camera's draw_visuals)."""
@@ -92,59 +101,59 @@ def normalize_angle(angle):
     """Normalize angle to [-180, 180] degrees (matches camera's draw_visuals)."""
     return (angle + 180) % 360 - 180
 
-def turn_to_angle(target_angle, target_index):
-    """Turn rover until its orientation matches the target angle."""
-    while True:
-        red_pixel, blue_pixel = get_markers(target_index)
-        center = calculate_center(red_pixel, blue_pixel)
-        _, current_angle = calculate_angle_and_length(red_pixel, blue_pixel)
-        angle_error = normalize_angle(target_angle - current_angle)
-        print(f"angle error: {angle_error}")
-        if abs(angle_error) <= ANGLE_TOLERANCE:
-            stop()
-            break
-
-        if angle_error > 0:
-            left(SPEED)  # Turn left (counterclockwise)
-        else:
-            right(SPEED)  # Turn right (clockwise)
-        time.sleep(STEP_TIME)
+def steer(markers):
+    """Control tick: steer towards the current target from the latest markers; return False when done."""
+    global target_index
+    red_pixel, blue_pixel = markers
+    if red_pixel is None or blue_pixel is None:
+        set_mode('markers missing', "Markers not detected. Waiting...")
+        halt()
+        return True
+
+    target = targets[target_index]
+    center = calculate_center(red_pixel, blue_pixel)
+    orientation_length, current_angle = calculate_angle_and_length(red_pixel, blue_pixel)
+    target_vector = (target[0] - center[0], target[1] - center[1])
+    distance = math.hypot(target_vector[0], target_vector[1])
+
+    if distance <= POSITION_TOLERANCE:
+        halt()
+        print(f"Reached target {target_index}: {target}")
+        target_index += 1
+        if target_index == len(targets):
+            print("All targets reached!")
+            return False
+        print(f"Navigating to target {target_index}: {targets[target_index]}")
+        return True
+
+    target_angle = math.degrees(math.atan2(target_vector[1], target_vector[0]))
+    angle_error = normalize_angle(target_angle - current_angle)
+
+    if abs(angle_error) > ANGLE_TOLERANCE:
+        set_mode('turning', f"Turning: angle error {angle_error:.2f} deg, distance {distance:.2f}, {camera.rtt_text()}")
+    else:
+        set_mode('driving', f"Driving: angle error {angle_error:.2f} deg, distance {distance:.2f}, "
+                            f"orientation_length: {orientation_length:.2f}, {camera.rtt_text()}")
+    # A positive angle error is counterclockwise (left); the controller takes positive as right
+    set_wheels(*steering.update(-angle_error, distance))
+    return True
+
+def set_mode(mode, message):
+    """Print message when the rover switches to a different mode (the tick runs too often to log every step)."""
+    global last_mode
+    if mode != last_mode:
+        last_mode = mode
+        print(message)
 
 def main():
-    """Main control loop for autonomous navigation."""
-    for i, target in enumerate(targets):
-        print(f"Navigating to target {i}: {target}")
-
-        while True:
-            red_pixel, blue_pixel = get_markers(i)
-            center = calculate_center(red_pixel, blue_pixel)
-            orientation_length, current_angle = calculate_angle_and_length(red_pixel, blue_pixel)
-            print(f"orientation_length: {orientation_length}, current_angle: {current_angle}")
-            target_vector = (target[0] - center[0], target[1] - center[1])
-            distance = math.hypot(target_vector[0], target_vector[1])
-            print(f"distance: {distance}")
-
-            if distance <= POSITION_TOLERANCE:
-                print(f"Reached target {i}: {target}")
-                break
-
-            target_angle = math.degrees(math.atan2(target_vector[1], target_vector[0]))
-            angle_error = normalize_angle(target_angle - current_angle)
-
-            angle_between = calculate_angle_between_lines(red_pixel, blue_pixel, center, target)
-            print(f"Angle between orientation and target: {angle_between:.2f} deg")  # For debugging
-
-            if abs(angle_error) > ANGLE_TOLERANCE:
-                turn_to_angle(target_angle, i)
-                continue
-
-
-            backward()
-            time.sleep(STEP_TIME)
-            stop()
-
-    stop()
-    print("All targets reached!")
+    """Main control loop for autonomous navigation, ticking at a fixed rate on the latest markers."""
+    print(f"Navigating to target {target_index}: {targets[target_index]}")
+    runtime = RoverRuntime(marker_poller, steer, halt)
+    try:
+        runtime.run()
+    finally:
+        stop()
+        print(runtime.stats_text())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
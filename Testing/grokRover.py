@@ -1,17 +1,30 @@
-import time
+import os
+import sys
 from adafruit_motorkit import MotorKit
-import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Autonomous'))
+from cameraClient import CameraClient, StatePoller
+from roverRuntime import RoverRuntime
+from steeringControl import DifferentialDriveController
 
 # Initialize motor kit
 kit = MotorKit()
 
 # Rover-specific constants
 SPEED = 0.5  # Default motor speed (-1.0 to 1.0)
-STEP_TIME = 0.05  # Time per movement step (seconds)
 
 # Camera server URL (replace with your camera Pi's IP)
 CAMERA_URL = 'http://192.168.0.103:12345'
 
+# One kept-alive connection to the camera server, polled in the background so the
+# control loop only ever reads the latest action
+camera = CameraClient(CAMERA_URL)
+action_poller = StatePoller(camera, '/action')
+last_action = None
+
+# Proportional steering towards the current target, from the camera's heading error
+steering = DifferentialDriveController(cruise_speed=SPEED)
+
 # Motor control functions
 def forward(speed=SPEED):
     """Move the rover forward at the specified speed."""
@@ -38,48 +51,45 @@ def stop():
     kit.motor1.throttle = 0
     kit.motor2.throttle = 0
 
-def get_action():
-    """Fetch the action from the camera server."""
-    while True:
-        try:
-            response = requests.get(f'{CAMERA_URL}/action', timeout=3)
-            if response.status_code != 200:
-                print(f"HTTP {response.status_code}. Retrying...")
-                time.sleep(0.1)
-                continue
-            data = response.json()
-            return data.get('action'), data.get('distance'), data.get('angle')
-        except (requests.RequestException, KeyError) as e:
-            print(f"Error fetching action: {e}. Retrying...")
-            time.sleep(0.1)
-            stop()
+def set_wheels(left_speed, right_speed):
+    """Drive each wheel at its own speed, positive forward (-1.0 to 1.0)."""
+    kit.motor1.throttle = -left_speed   # Wheel that drives forward in right()
+    kit.motor2.throttle = -right_speed  # Wheel that drives forward in left()
+
+def halt():
+    """Stop the rover and forget the steering history, so it restarts cleanly."""
+    stop()
+    steering.reset()
+
+def drive(data):
+    """Control tick: steer towards the camera server's current target; return False once all targets are reached."""
+    global last_action
+    action = data.get('action')
+
+    # Log the action, distance, and angle for debugging when it changes
+    if action != last_action:
+        last_action = action
+        print(f"Action: {action}, Distance: {data.get('distance')}, Angle: {data.get('angle')}, {camera.rtt_text()}")
+
+    if action == 'stop':
+        halt()
+        print("All targets reached!")
+        return False
+    if action in ('forward', 'left', 'right') and data.get('angle') is not None:
+        # Turn in proportion to the heading error rather than spinning on 'left'/'right'
+        set_wheels(*steering.update(data['angle'], data.get('distance')))
+    else:
+        halt()
+    return True
 
 def main():
-    """Main control loop for autonomous navigation."""
-    while True:
-        # Get the action from the camera server
-        action, distance, angle = get_action()
-
-        # Log the action, distance, and angle for debugging
-        print(f"Action: {action}, Distance: {distance}, Angle: {angle}")
-
-        # Perform the action
-        if action == 'forward':
-            forward()
-        elif action == 'left':
-            left()
-        elif action == 'right':
-            right()
-        elif action == 'stop':
-            stop()
-            print("All targets reached!")
-            break
-        else:
-            print(f"Unknown action: {action}")
-            stop()
-
-        # Wait for the next step
-        time.sleep(STEP_TIME)
+    """Main control loop for autonomous navigation, ticking at a fixed rate on the latest action."""
+    runtime = RoverRuntime(action_poller, drive, halt)
+    try:
+        runtime.run()
+    finally:
+        stop()
+        print(runtime.stats_text())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file